@@ -0,0 +1,196 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from itertools import product
+from multiprocessing import Pool
+from typing import Callable, TypedDict
+
+import configuration as C
+import engine
+
+'''
+  runs many headless games of `engine.py` across a process pool, e.g. to balance levels and ball velocities or to compare paddle policies.
+
+  usage:
+  - python batch_run.py --levels configuration.Level1 configuration.Level3 --velocities 5 10 --policies follow noisy --seeds 1000
+  - levels are given as `module.Class`, so own maps can be put into any module next to this script as long as the class has a MAP and a BALL_VELOCITY.
+
+  every game is simulated in a worker process and sent back as soon as it is done. the results are aggregated per level, velocity and policy while they arrive, optionally every single result is written to a json lines file.
+'''
+
+class T_Job(TypedDict):
+  level: str
+  velocity: float
+  policy: str
+  seed: int
+  balls: int
+  max_ticks: int
+
+class T_Job_Result(TypedDict):
+  level: str
+  velocity: float
+  policy: str
+  seed: int
+  balls: int
+  score: int
+  ticks: int
+  bounces: int
+  cleared: bool
+
+'''
+  paddle policies. a policy gets the game and a random generator seeded with the seed of the job and returns acc_x for the next tick.
+'''
+def _follow(game: engine.Game, rng: random.Random) -> float:
+  '''
+    moves the paddle below the ball that is closest to the bottom.
+  '''
+  offset = game.balls.x[game.balls.lowest()] - (game.paddle.x + game.paddle.width / 2)
+
+  return max(-1.0, min(1.0, offset / C.Paddle.VELOCITY))
+
+def _noisy(game: engine.Game, rng: random.Random) -> float:
+  return max(-1.0, min(1.0, _follow(game, rng) + rng.gauss(0, C.Batch.POLICY_NOISE)))
+
+def _lazy(game: engine.Game, rng: random.Random) -> float:
+  '''
+    only reacts when the ball is in the lower half of the world, like a player that watches the bricks.
+  '''
+  if game.balls.y[game.balls.lowest()] > C.World.END_Y / 2:
+    return 0.0
+
+  return _follow(game, rng)
+
+def _random(game: engine.Game, rng: random.Random) -> float:
+  return rng.uniform(-1.0, 1.0)
+
+POLICIES: dict[str, Callable[[engine.Game, random.Random], float]] = {
+  'follow': _follow,
+  'noisy': _noisy,
+  'lazy': _lazy,
+  'random': _random
+}
+
+def _load_level(name: str) -> type:
+  module_name, _, class_name = name.rpartition('.')
+  level = getattr(importlib.import_module(module_name or 'configuration'), class_name)
+
+  if not hasattr(level, 'MAP') or not hasattr(level, 'BALL_VELOCITY'):
+    raise ValueError(f'"{name}" is not a level, it needs a MAP and a BALL_VELOCITY.')
+
+  return level
+
+def run_job(job: T_Job) -> T_Job_Result:
+  '''
+    plays a single level once. it runs in a worker process, therefore the job only contains names and numbers that are cheap to send to the worker.
+  '''
+  base = _load_level(job['level'])
+  level = type(base.__name__, (), { 'MAP': base.MAP, 'BALL_VELOCITY': job['velocity'] })
+  policy = POLICIES[job['policy']]
+  rng = random.Random(job['seed'])
+
+  result = engine.simulate(lambda game: policy(game, rng), levels=[level], max_ticks=job['max_ticks'], seed=job['seed'], balls=job['balls'])
+
+  return {
+    'level': job['level'],
+    'velocity': job['velocity'],
+    'policy': job['policy'],
+    'seed': job['seed'],
+    'balls': job['balls'],
+    'score': result['score'],
+    'ticks': result['ticks'],
+    'bounces': result['bounces'],
+    'cleared': result['cleared']
+  }
+
+class Aggregate:
+  '''
+    running totals of all games with the same level, velocity and policy. they are updated one result at a time, so no result has to be kept in memory.
+  '''
+  def __init__(self) -> None:
+    self.games = 0
+    self.cleared = 0
+    self.clear_ticks = 0
+    self.score = 0
+    self.bounces = 0
+
+  def add(self, result: T_Job_Result) -> None:
+    self.games = self.games + 1
+    self.score = self.score + result['score']
+    self.bounces = self.bounces + result['bounces']
+
+    if result['cleared']:
+      self.cleared = self.cleared + 1
+      self.clear_ticks = self.clear_ticks + result['ticks']
+
+  def to_dict(self) -> dict:
+    return {
+      'games': self.games,
+      'completion_rate': self.cleared / self.games,
+      #time to clear only counts games that were cleared and is given in seconds of game time.
+      'time_to_clear': self.clear_ticks / self.cleared / C.Physics.TICKS_PER_SEC if self.cleared else None,
+      'score': self.score / self.games,
+      'bounces': self.bounces / self.games
+    }
+
+def _jobs(levels: list[str], velocities: list[float] | None, policies: list[str], seeds: int, first_seed: int, balls: int, max_ticks: int):
+  for level, policy, seed in product(levels, policies, range(first_seed, first_seed + seeds)):
+    for velocity in velocities or [_load_level(level).BALL_VELOCITY]:
+      yield { 'level': level, 'velocity': velocity, 'policy': policy, 'seed': seed, 'balls': balls, 'max_ticks': max_ticks }
+
+def run(levels: list[str], velocities: list[float] | None, policies: list[str], seeds: int, first_seed: int = 0, balls: int = 1, max_ticks: int = C.Batch.MAX_TICKS, workers: int | None = None, output: str | None = None) -> dict[tuple, Aggregate]:
+  for level in levels:
+    _load_level(level)
+  for policy in policies:
+    if policy not in POLICIES:
+      raise ValueError(f'"{policy}" is not a policy, choose from {", ".join(POLICIES)}.')
+
+  workers = workers or os.cpu_count() or 1
+  total = len(levels) * len(policies) * seeds * (len(velocities) if velocities else 1)
+  aggregates: dict[tuple, Aggregate] = {}
+  output_file = open(output, 'w') if output else None
+  start = time.perf_counter()
+
+  try:
+    #games are handed out in chunks so that the workers do not wait for the main process between short games. imap_unordered returns every result as soon as its chunk is done.
+    chunksize = max(1, min(C.Batch.MAX_CHUNKSIZE, total // (workers * 4)))
+    with Pool(workers) as pool:
+      for done, result in enumerate(pool.imap_unordered(run_job, _jobs(levels, velocities, policies, seeds, first_seed, balls, max_ticks), chunksize), start=1):
+        key = (result['level'], result['velocity'], result['policy'])
+        aggregates.setdefault(key, Aggregate()).add(result)
+
+        if output_file:
+          output_file.write(json.dumps(result) + '\n')
+
+        if done % C.Batch.PROGRESS_INTERVAL == 0 or done == total:
+          elapsed = time.perf_counter() - start
+          print(f'{done}/{total} games, {done / elapsed:.0f} games/s', file=sys.stderr)
+  finally:
+    if output_file:
+      output_file.close()
+
+  return aggregates
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='simulate many headless games across a process pool and aggregate the results per level.')
+  parser.add_argument('--levels', nargs='+', default=['configuration.Level1', 'configuration.Level2', 'configuration.Level3'], help='levels as module.Class')
+  parser.add_argument('--velocities', nargs='+', type=float, default=None, help='ball velocities, defaults to the BALL_VELOCITY of each level')
+  parser.add_argument('--policies', nargs='+', default=['follow'], choices=list(POLICIES))
+  parser.add_argument('--seeds', type=int, default=100, help='number of seeds per level, velocity and policy')
+  parser.add_argument('--first-seed', type=int, default=0)
+  parser.add_argument('--balls', type=int, default=1, help='number of balls at the start of every game')
+  parser.add_argument('--max-ticks', type=int, default=C.Batch.MAX_TICKS, help='a game that is still running after this many ticks counts as not cleared')
+  parser.add_argument('--workers', type=int, default=None, help='number of processes, defaults to the number of cores')
+  parser.add_argument('--output', default=None, help='write every single result to this json lines file')
+  args = parser.parse_args()
+
+  aggregates = run(args.levels, args.velocities, args.policies, args.seeds, args.first_seed, args.balls, args.max_ticks, args.workers, args.output)
+
+  for (level, velocity, policy), aggregate in sorted(aggregates.items()):
+    print(json.dumps({ 'level': level, 'velocity': velocity, 'policy': policy, **aggregate.to_dict() }))
+
+if __name__ == '__main__':
+  main()
@@ -1,5 +1,21 @@
 class Input:
   PORT = 5700
+  #receive with asyncio on a background event loop instead of a blocking thread, the loop can be shared with further sensors.
+  ASYNC = False
+  #drain all queued datagrams on every wakeup and keep only the newest value of each capability, so the input does not lag behind under load.
+  COALESCE = True
+  #filter pipeline for the x tilt: calibration offset, dead zone around the offset, low-pass, largest change per sample and clamp.
+  OFFSET = 0.0
+  DEAD_ZONE = 0.05
+  EMA_ALPHA = 0.5
+  MAX_STEP = 0.25
+  CLAMP = 1.0
+  #extrapolate acc_x from the newest PREDICTION_WINDOW samples to PREDICTION_HORIZON milliseconds in the future, roughly the time until the frame is shown. predictions stop MAX_PREDICTION milliseconds after the newest sample.
+  PREDICT = True
+  PREDICTION_HORIZON = 1000 / 60
+  PREDICTION_WINDOW = 6
+  MAX_PREDICTION = 100
+  HISTORY_SIZE = 256
 
 class Font:
   NAME = "Verdana"
@@ -24,6 +40,18 @@ class Colour:
 class Window:
   WIDTH = 600
   HEIGTH = 800
+  FPS = 60
+
+class Physics:
+  #velocities are given in pixels per tick.
+  TICKS_PER_SEC = 60
+  TIMESTEP = 1 / TICKS_PER_SEC
+  MAX_SUBSTEPS = 8
+  #swept collision stops the ball at the exact point of impact within a tick instead of testing where it ends up. a ball can bounce at most MAX_IMPACTS times per tick.
+  SWEPT = True
+  MAX_IMPACTS = 4
+  #up to this many balls are moved one by one with plain floats, the numpy arrays only pay off for more balls.
+  SCALAR_BALLS = 16
 
 class HUD:
   TITLE = "BREAKOUT"
@@ -63,6 +91,11 @@ class Brick:
   START_Y = World.END_Y - 30
   BRICKS_PER_ROW = 8
   GAP = (Window.WIDTH - (BRICKS_PER_ROW * WIDTH)) / (BRICKS_PER_ROW - 1)
+  #a slot is one brick plus the gap to its neighbour. the brick in column 0 starts one gap left of START_X and the brick in row 0 ends one gap above START_Y + HEIGTH.
+  SLOT_WIDTH = WIDTH + GAP
+  SLOT_HEIGTH = HEIGTH + GAP
+  SLOT_START_X = START_X - GAP
+  SLOT_START_Y = START_Y + GAP + HEIGTH
 
 class Paddle:
   WIDTH = 100
@@ -71,13 +104,18 @@ class Paddle:
   START_Y = 10
   VELOCITY = 15
   IMMUNITY = 0.5
+  IMMUNITY_TICKS = round(IMMUNITY * Physics.TICKS_PER_SEC)
 
 class Ball:
   RADIUS = 7
+  #number of balls at the start of a game.
+  COUNT = 1
   START_X = (Window.WIDTH / 2) + (RADIUS / 2)
   START_Y = Paddle.START_Y + Paddle.HEIGTH + RADIUS
   START_DIR_X = 1
   START_DIR_Y = 1
+  #headless games with a seed move the start of the ball by up to START_VARIATION pixels.
+  START_VARIATION = Paddle.WIDTH / 2 - RADIUS
 
 class Level1:
   BALL_VELOCITY = 5
@@ -132,4 +170,10 @@ class Level3:
     [None, None, None, None, None, None, None, None]
   ]
 
-  
\ No newline at end of file
+  
+class Batch:
+  #ten minutes of game time.
+  MAX_TICKS = 10 * 60 * Physics.TICKS_PER_SEC
+  MAX_CHUNKSIZE = 16
+  PROGRESS_INTERVAL = 500
+  POLICY_NOISE = 0.3
@@ -0,0 +1,924 @@
+import random
+from enum import IntEnum
+from math import inf, copysign, sqrt
+from typing import Callable, Iterable, TypedDict
+
+import numpy as np
+
+import configuration as C
+
+'''
+  game state and physics of breakout. nothing in here depends on pyglet or the sensor, so a game can run without a window or gl context, e.g. to simulate many games in tests or on machines without a gpu. `main.py` draws the game and feeds the input of the M5Stack into it.
+'''
+
+class Balls:
+  '''
+    physical state of all balls of a game. positions, directions and velocities are stored in numpy arrays with one entry per ball, so every collision is resolved for all balls together and a game with hundreds of balls costs little more than a game with one. up to `C.Physics.SCALAR_BALLS` balls are still moved one by one with plain floats, because the numpy calls cost more than they save for a few balls. a lost ball stays in the arrays but is no longer active. the positions of the previous tick are kept so that a view can draw the balls between the last two ticks.
+  '''
+  FIELDS = (('x', np.float64), ('y', np.float64), ('prev_x', np.float64), ('prev_y', np.float64), ('dir_x', np.float64), ('dir_y', np.float64), ('velocity', np.float64), ('active', bool), ('immunity', np.int32))
+
+  def __init__(self, capacity: int = 1) -> None:
+    self.count = 0
+    self.radius = C.Ball.RADIUS
+    self.radius_sq = self.radius * self.radius
+    '''
+      after the paddle is hit by a ball the ball gets immunity to interaction with the paddle, therefore there are no possible further bounces in a defined timeframe. this is due to a bug where the ball sticks and flows over the paddle when it hit the paddle in a certain angle while the paddle is moving. immunity enforces that the ball left the area until the paddle can interact again. the immunity is counted in physics ticks so that it does not depend on the frame rate. it is only used without swept collision.
+    '''
+    for name, dtype in Balls.FIELDS:
+      setattr(self, name, np.zeros(max(capacity, 1), dtype=dtype))
+
+  def _grow(self) -> None:
+    for name, dtype in Balls.FIELDS:
+      grown = np.zeros(2 * len(self.x), dtype=dtype)
+      grown[:self.count] = getattr(self, name)[:self.count]
+      setattr(self, name, grown)
+
+  def add(self, x: float, y: float, dir_x: float, dir_y: float, velocity: float) -> int:
+    if self.count == len(self.x):
+      self._grow()
+
+    index = self.count
+    self.x[index] = self.prev_x[index] = x
+    self.y[index] = self.prev_y[index] = y
+    self.dir_x[index] = dir_x
+    self.dir_y[index] = dir_y
+    self.velocity[index] = velocity
+    self.active[index] = True
+    self.immunity[index] = 0
+    self.count = self.count + 1
+
+    return index
+
+  def alive(self) -> np.ndarray:
+    '''
+      returns the indices of all balls that are still in the game.
+    '''
+    return self.active[:self.count].nonzero()[0]
+
+  def lowest(self) -> int:
+    '''
+      returns the index of the active ball closest to the bottom, which is the one the paddle has to catch next, or -1 if there is none.
+    '''
+    alive = self.alive()
+    if len(alive) == 0:
+      return -1
+
+    return int(alive[np.argmin(self.y[alive])])
+
+  def move(self) -> None:
+    n = self.count
+    self.prev_x[:n] = self.x[:n]
+    self.prev_y[:n] = self.y[:n]
+    moving = self.active[:n]
+    self.x[:n] = self.x[:n] + np.where(moving, self.dir_x[:n] * self.velocity[:n], 0)
+    self.y[:n] = self.y[:n] + np.where(moving, self.dir_y[:n] * self.velocity[:n], 0)
+
+  def reflect(self, index: np.ndarray, normal_x: np.ndarray, normal_y: np.ndarray) -> None:
+    '''
+      reflects the direction of the given balls at surfaces with the given unit normals. for the sides of walls, bricks and the paddle this just inverts one axis, the corners of bricks have diagonal normals.
+    '''
+    dot = self.dir_x[index] * normal_x + self.dir_y[index] * normal_y
+    self.dir_x[index] = self.dir_x[index] - 2 * dot * normal_x
+    self.dir_y[index] = self.dir_y[index] - 2 * dot * normal_y
+
+class World:
+  __slots__ = ('left', 'right', 'bottom', 'top')
+
+  def __init__(self) -> None:
+    self.left = C.World.START_X
+    self.right = C.World.END_X
+    self.bottom = C.World.START_Y
+    self.top = C.World.END_Y
+
+  def collides_with(self, balls: Balls, index: np.ndarray) -> np.ndarray:
+    '''
+      bounces the given balls off the side walls and the top. all sides in the game are axis aligned, therefore the distance between a ball and a wall is just the difference of one coordinate and comparing the squares avoids abs() and square roots. returns the mask of balls that touched the bottom and are lost.
+    '''
+    x = balls.x[index]
+    y = balls.y[index]
+    left = (x - self.left) ** 2 < balls.radius_sq
+    right = ~left & ((x - self.right) ** 2 < balls.radius_sq)
+    top = ~left & ~right & ((y - self.top) ** 2 < balls.radius_sq)
+    bottom = ~left & ~right & ~top & ((y - self.bottom) ** 2 < balls.radius_sq)
+
+    balls.dir_x[index[left | right]] *= -1
+    balls.dir_y[index[top]] *= -1
+
+    return bottom
+
+  def sweep(self, x: np.ndarray, y: np.ndarray, dx: np.ndarray, dy: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+      returns the fraction of the movements (dx, dy) after which each ball touches a wall and the normal of that wall. the fraction is infinite if no wall is reached. the balls are inside the world, therefore only the wall in the direction of movement of each axis can be hit.
+    '''
+    t_x = np.divide(np.where(dx < 0, self.left + radius, self.right - radius) - x, dx, out=np.full(len(x), inf), where=dx != 0)
+    t_y = np.divide(np.where(dy < 0, self.bottom + radius, self.top - radius) - y, dy, out=np.full(len(y), inf), where=dy != 0)
+
+    hits_x = t_x <= t_y
+    t = np.maximum(np.where(hits_x, t_x, t_y), 0)
+
+    return t, np.where(hits_x, -np.sign(dx), 0.0), np.where(hits_x, 0.0, -np.sign(dy))
+
+  def sweep_one(self, x: float, y: float, dx: float, dy: float, radius: float) -> tuple[float, float, float]:
+    '''
+      `sweep()` for a single ball with plain floats.
+    '''
+    t_x = t_y = inf
+    if dx < 0:
+      t_x = (self.left + radius - x) / dx
+    elif dx > 0:
+      t_x = (self.right - radius - x) / dx
+    if dy < 0:
+      t_y = (self.bottom + radius - y) / dy
+    elif dy > 0:
+      t_y = (self.top - radius - y) / dy
+
+    if t_x <= t_y:
+      return max(t_x, 0.0), -copysign(1.0, dx), 0.0
+    return max(t_y, 0.0), 0.0, -copysign(1.0, dy)
+
+class Paddle:
+  '''
+    physical state of the paddle. like the balls it keeps the position of the previous tick. the edges of the paddle are stored and only updated when the paddle moves, so collision tests do not have to build them every tick.
+  '''
+  __slots__ = ('x', 'y', 'prev_x', 'width', 'height', 'left', 'right', 'bottom', 'top', '_velocity')
+
+  def __init__(self, velocity: float) -> None:
+    self.x = self.prev_x = C.Paddle.START_X
+    self.y = C.Paddle.START_Y
+    self.width = C.Paddle.WIDTH
+    self.height = C.Paddle.HEIGTH
+    self.left = self.x
+    self.right = self.x + self.width
+    self.bottom = self.y
+    self.top = self.y + self.height
+    self._velocity = velocity
+
+  def move(self, acc_x: float, world: World, balls: Balls | None = None) -> None:
+    '''
+      if balls are given, the paddle can not be moved into any of them. otherwise it could squeeze a ball against a wall, where the ball would bounce between the wall and the paddle forever.
+    '''
+    self.prev_x = self.x
+    new_x = self.x + (acc_x * self._velocity)
+
+    if balls is not None and self._overlaps(new_x, balls):
+      return
+
+    if new_x >= world.left and new_x <= world.right - self.width:
+      self.x = new_x
+      self.left = new_x
+      self.right = new_x + self.width
+
+  def _overlaps(self, x: float, balls: Balls) -> bool:
+    index = balls.alive()
+    if len(index) <= C.Physics.SCALAR_BALLS:
+      for i in index.tolist():
+        ball_x = float(balls.x[i])
+        ball_y = float(balls.y[i])
+        closest_x = min(max(ball_x, x), x + self.width) - ball_x
+        closest_y = min(max(ball_y, self.bottom), self.top) - ball_y
+        if closest_x * closest_x + closest_y * closest_y < balls.radius_sq:
+          return True
+      return False
+
+    if balls.y[index].min() - balls.radius >= self.top:
+      return False
+
+    closest_x = np.clip(balls.x[index], x, x + self.width) - balls.x[index]
+    closest_y = np.clip(balls.y[index], self.bottom, self.top) - balls.y[index]
+
+    return bool(np.any(closest_x * closest_x + closest_y * closest_y < balls.radius_sq))
+
+  def collides_with(self, balls: Balls, index: np.ndarray) -> np.ndarray:
+    '''
+      bounces the given balls off the paddle and returns the mask of balls that were hit.
+    '''
+    immune = balls.immunity[index] > 0
+    balls.immunity[index[immune]] -= 1
+
+    x = balls.x[index]
+    y = balls.y[index]
+    top = ~immune & ((y - self.top) ** 2 < balls.radius_sq) & (self.left <= x) & (self.right >= x)
+    #hitting the ball with the sides of the paddle pushes it straight back instead of bouncing it of with the negative angle which would lead to game over.
+    side = ~immune & ~top & (((x - self.left) ** 2 < balls.radius_sq) | ((x - self.right) ** 2 < balls.radius_sq)) & (self.bottom <= y) & (self.top >= y)
+    hit = top | side
+
+    balls.dir_y[index[hit]] *= -1
+    balls.dir_x[index[side]] *= -1
+    balls.immunity[index[hit]] = C.Paddle.IMMUNITY_TICKS
+
+    return hit
+
+  def collides_with_one(self, balls: Balls, i: int) -> bool:
+    '''
+      `collides_with()` for the single ball i with plain floats.
+    '''
+    if balls.immunity[i] > 0:
+      balls.immunity[i] -= 1
+      return False
+
+    x = float(balls.x[i])
+    y = float(balls.y[i])
+    if (y - self.top) ** 2 < balls.radius_sq and self.left <= x and self.right >= x:
+      balls.dir_y[i] = -balls.dir_y[i]
+    #hitting the ball with the sides of the paddle pushes it straight back instead of bouncing it of with the negative angle which would lead to game over.
+    elif ((x - self.left) ** 2 < balls.radius_sq or (x - self.right) ** 2 < balls.radius_sq) and self.bottom <= y and self.top >= y:
+      balls.dir_y[i] = -balls.dir_y[i]
+      balls.dir_x[i] = -balls.dir_x[i]
+    else:
+      return False
+
+    balls.immunity[i] = C.Paddle.IMMUNITY_TICKS
+
+    return True
+
+  def sweep_one(self, x: float, y: float, dx: float, dy: float, radius: float) -> tuple[float, float, float]:
+    '''
+      `sweep()` for a single ball, the fraction is infinite if the ball does not come near the paddle.
+    '''
+    if min(x, x + dx) - radius > self.right or max(x, x + dx) + radius < self.left or min(y, y + dy) - radius > self.top or max(y, y + dy) + radius < self.bottom:
+      return inf, 0.0, 0.0
+
+    return sweep_circle_rect_one(x, y, dx, dy, radius, self.left, self.bottom, self.right, self.top)
+
+  def sweep(self, x: np.ndarray, y: np.ndarray, dx: np.ndarray, dy: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    '''
+      like `BrickStore.sweep()` for the paddle. returns None if no ball comes near the paddle, which is the case most of the time, therefore the bounding boxes are compared before the exact test.
+    '''
+    near = np.flatnonzero((np.minimum(x, x + dx) - radius <= self.right) & (np.maximum(x, x + dx) + radius >= self.left) & (np.minimum(y, y + dy) - radius <= self.top) & (np.maximum(y, y + dy) + radius >= self.bottom))
+    if len(near) == 0:
+      return None
+
+    t = np.full(len(x), inf)
+    normal_x = np.zeros(len(x))
+    normal_y = np.zeros(len(x))
+    t[near], normal_x[near], normal_y[near] = sweep_circle_rect(x[near], y[near], dx[near], dy[near], radius, self.left, self.bottom, self.right, self.top)
+
+    return t, normal_x, normal_y
+
+class Side(IntEnum):
+  NONE = -1
+  BOTTOM = 0
+  TOP = 1
+  LEFT = 2
+  RIGHT = 3
+
+def sweep_circle_rect(x, y, dx, dy, radius, left, bottom, right, top):
+  '''
+    continuous collision between a moving circle and axis aligned rectangles. returns the fraction of the movement (dx, dy) after which the circle first touches each rectangle together with the unit normal of the touched surface. the fraction is infinite if the circle misses the rectangle, moves away from it or does not reach it within the movement. all arguments may be numpy arrays, so many rectangles are tested in one pass.
+
+    the circle touches a rectangle when its center enters the rectangle grown by the radius. the grown rectangle has rounded corners, therefore the entry point is first computed with the slab method for the grown rectangle with sharp corners and, if it lies in a corner region, computed again as the intersection of the path with the circle around that corner.
+  '''
+  with np.errstate(divide='ignore', invalid='ignore'):
+    #slab method: the entry into the grown rectangle is the latest entry into the slabs of both axes, the exit the earliest exit. a path parallel to a slab is either always or never inside of it.
+    t_x1 = (left - radius - x) / dx
+    t_x2 = (right + radius - x) / dx
+    t_y1 = (bottom - radius - y) / dy
+    t_y2 = (top + radius - y) / dy
+
+    inside_x = (x >= left - radius) & (x <= right + radius)
+    inside_y = (y >= bottom - radius) & (y <= top + radius)
+    t_x_enter = np.where(dx == 0, np.where(inside_x, -inf, inf), np.minimum(t_x1, t_x2))
+    t_x_exit = np.where(dx == 0, np.where(inside_x, inf, -inf), np.maximum(t_x1, t_x2))
+    t_y_enter = np.where(dy == 0, np.where(inside_y, -inf, inf), np.minimum(t_y1, t_y2))
+    t_y_exit = np.where(dy == 0, np.where(inside_y, inf, -inf), np.maximum(t_y1, t_y2))
+
+    t_enter = np.maximum(t_x_enter, t_y_enter)
+    t_exit = np.minimum(t_x_exit, t_y_exit)
+    hit = (t_enter <= t_exit) & (t_exit >= 0) & (t_enter <= 1)
+
+    #the normal of the entry is the side of the slab that is entered last. a circle that already overlaps the grown rectangle is pushed out along the axis of the smaller overlap instead.
+    enters_x = t_x_enter > t_y_enter
+    t = np.maximum(t_enter, 0)
+    normal_x = np.where(enters_x, -np.sign(dx), 0.0)
+    normal_y = np.where(enters_x, 0.0, -np.sign(dy))
+
+    overlap_x = (right - left) / 2 + radius - np.abs(x - (left + right) / 2)
+    overlap_y = (top - bottom) / 2 + radius - np.abs(y - (bottom + top) / 2)
+    pushed_x = overlap_x < overlap_y
+    normal_x = np.where(t_enter < 0, np.where(pushed_x, np.sign(x - (left + right) / 2), 0.0), normal_x)
+    normal_y = np.where(t_enter < 0, np.where(pushed_x, 0.0, np.sign(y - (bottom + top) / 2)), normal_y)
+
+    #corner region: the entry point lies beside the rectangle on both axes.
+    entry_x = x + t * dx
+    entry_y = y + t * dy
+    corner = ((entry_x < left) | (entry_x > right)) & ((entry_y < bottom) | (entry_y > top))
+    corner_x = np.where(entry_x < left, left, right)
+    corner_y = np.where(entry_y < bottom, bottom, top)
+
+    #solve |(x, y) + t * (dx, dy) - corner| = radius for the smaller t.
+    offset_x = x - corner_x
+    offset_y = y - corner_y
+    a = dx * dx + dy * dy
+    b = offset_x * dx + offset_y * dy
+    c = offset_x * offset_x + offset_y * offset_y - radius * radius
+    discriminant = b * b - a * c
+    root = (-b - np.sqrt(discriminant)) / a
+    #a circle that already overlaps the corner touches it right away.
+    t_corner = np.where(c <= 0, 0.0, root)
+    corner_hit = (c <= 0) | ((discriminant >= 0) & (root >= 0) & (root <= 1))
+
+    touch_x = offset_x + t_corner * dx
+    touch_y = offset_y + t_corner * dy
+    length = np.hypot(touch_x, touch_y)
+    t = np.where(corner, t_corner, t)
+    normal_x = np.where(corner, touch_x / length, normal_x)
+    normal_y = np.where(corner, touch_y / length, normal_y)
+    hit = hit & (~corner | corner_hit)
+
+    #a circle that already touches the rectangle but moves away from it, e.g. right after it bounced off, does not collide again.
+    approaching = normal_x * dx + normal_y * dy < 0
+
+    return np.where(hit & approaching, t, inf), normal_x, normal_y
+
+def _sign(value: float) -> float:
+  return 1.0 if value > 0 else -1.0 if value < 0 else 0.0
+
+def sweep_circle_rect_one(x: float, y: float, dx: float, dy: float, radius: float, left: float, bottom: float, right: float, top: float) -> tuple[float, float, float]:
+  '''
+    `sweep_circle_rect()` for a single circle and a single rectangle with plain floats. it follows the array version step by step, but stops as soon as the rectangle is missed and builds no temporary arrays, which are most of the cost for a single ball. a path that can not touch the rectangle returns an infinite fraction and a zero normal.
+  '''
+  #slab method, a path parallel to a slab is either always or never inside of it.
+  if dx == 0:
+    inside_x = x >= left - radius and x <= right + radius
+    t_x_enter, t_x_exit = (-inf, inf) if inside_x else (inf, -inf)
+  else:
+    t_x1 = (left - radius - x) / dx
+    t_x2 = (right + radius - x) / dx
+    t_x_enter, t_x_exit = min(t_x1, t_x2), max(t_x1, t_x2)
+  if dy == 0:
+    inside_y = y >= bottom - radius and y <= top + radius
+    t_y_enter, t_y_exit = (-inf, inf) if inside_y else (inf, -inf)
+  else:
+    t_y1 = (bottom - radius - y) / dy
+    t_y2 = (top + radius - y) / dy
+    t_y_enter, t_y_exit = min(t_y1, t_y2), max(t_y1, t_y2)
+
+  t_enter = max(t_x_enter, t_y_enter)
+  t_exit = min(t_x_exit, t_y_exit)
+  if not (t_enter <= t_exit and t_exit >= 0 and t_enter <= 1):
+    return inf, 0.0, 0.0
+
+  t = max(t_enter, 0.0)
+  if t_enter < 0:
+    overlap_x = (right - left) / 2 + radius - abs(x - (left + right) / 2)
+    overlap_y = (top - bottom) / 2 + radius - abs(y - (bottom + top) / 2)
+    if overlap_x < overlap_y:
+      normal_x, normal_y = _sign(x - (left + right) / 2), 0.0
+    else:
+      normal_x, normal_y = 0.0, _sign(y - (bottom + top) / 2)
+  elif t_x_enter > t_y_enter:
+    normal_x, normal_y = -_sign(dx), 0.0
+  else:
+    normal_x, normal_y = 0.0, -_sign(dy)
+
+  entry_x = x + t * dx
+  entry_y = y + t * dy
+  if (entry_x < left or entry_x > right) and (entry_y < bottom or entry_y > top):
+    offset_x = x - (left if entry_x < left else right)
+    offset_y = y - (bottom if entry_y < bottom else top)
+    c = offset_x * offset_x + offset_y * offset_y - radius * radius
+    if c <= 0:
+      t = 0.0
+    else:
+      a = dx * dx + dy * dy
+      b = offset_x * dx + offset_y * dy
+      discriminant = b * b - a * c
+      #a resting circle never reaches the corner, the array version gets nan there.
+      if discriminant < 0 or a == 0:
+        return inf, 0.0, 0.0
+      t = (-b - sqrt(discriminant)) / a
+      if t < 0 or t > 1:
+        return inf, 0.0, 0.0
+
+    touch_x = offset_x + t * dx
+    touch_y = offset_y + t * dy
+    #np.hypot like the array version, math.hypot can differ in the last bit and a game would take another course. corners are hit rarely, so the scalar call costs little.
+    length = float(np.hypot(touch_x, touch_y))
+    if length == 0:
+      return inf, 0.0, 0.0
+    normal_x = touch_x / length
+    normal_y = touch_y / length
+
+  if normal_x * dx + normal_y * dy >= 0:
+    return inf, 0.0, 0.0
+
+  return t, normal_x, normal_y
+
+class BrickStore:
+  '''
+    structure of arrays for all bricks of a level. x, y, width, height, alive flag and colour are stored in contiguous numpy arrays with one entry per brick slot of the level map, so the bricks around the balls are tested with one vectorized pass instead of one python call per brick. only the slots around each ball are gathered from the arrays, therefore the cost of a collision test does not depend on the size of the level.
+  '''
+  def __init__(self, rows: int, cols: int) -> None:
+    self.rows = rows
+    self.cols = cols
+    self.x = np.zeros((rows, cols), dtype=np.float64)
+    self.y = np.zeros((rows, cols), dtype=np.float64)
+    self.width = np.zeros((rows, cols), dtype=np.float64)
+    self.height = np.zeros((rows, cols), dtype=np.float64)
+    self.alive = np.zeros((rows, cols), dtype=bool)
+    self.colour = np.zeros((rows, cols, 3), dtype=np.uint8)
+    #(left, bottom, right, top) of every live brick as plain floats and None for empty slots, read by `sweep_one()` without touching the arrays.
+    self._rects = [None] * (rows * cols)
+    self._count = 0
+    self._bottom = inf
+    self._top = -inf
+
+  def __len__(self) -> int:
+    return self._count
+
+  def insert(self, row: int, col: int, x: float, y: float, colour: tuple[int, int, int]) -> None:
+    self.x[row, col] = x
+    self.y[row, col] = y
+    self.width[row, col] = C.Brick.WIDTH
+    self.height[row, col] = C.Brick.HEIGTH
+    self.colour[row, col] = colour
+    self.alive[row, col] = True
+    self._rects[row * self.cols + col] = (float(x), float(y), float(x) + C.Brick.WIDTH, float(y) + C.Brick.HEIGTH)
+    self._count = self._count + 1
+    self._bottom = min(self._bottom, y)
+    self._top = max(self._top, y + C.Brick.HEIGTH)
+
+  def remove(self, cell: int) -> None:
+    row, col = divmod(cell, self.cols)
+    self.alive[row, col] = False
+    self._rects[cell] = None
+    self._count = self._count - 1
+
+  def _window(self, left: float, bottom: float, right: float, top: float) -> tuple[slice, slice]:
+    '''
+      returns the rows and columns of all slots that are overlapped by a single bounding box as slices, like `_candidates()` for one ball without building index arrays.
+    '''
+    col_start = max(int((left - C.Brick.SLOT_START_X) // C.Brick.SLOT_WIDTH), 0)
+    col_end = min(int((right - C.Brick.SLOT_START_X) // C.Brick.SLOT_WIDTH), self.cols - 1)
+    row_start = max(int((C.Brick.SLOT_START_Y - top) // C.Brick.SLOT_HEIGTH), 0)
+    row_end = min(int((C.Brick.SLOT_START_Y - bottom) // C.Brick.SLOT_HEIGTH), self.rows - 1)
+
+    return slice(row_start, row_end + 1), slice(col_start, col_end + 1)
+
+  def _candidates(self, left: np.ndarray, bottom: np.ndarray, right: np.ndarray, top: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+      returns the slots that are overlapped by one bounding box per ball as a (balls, slots) array and a mask of the slots that are valid and hold a live brick. the y axis of the map points downwards while the y axis of the window points upwards, therefore the top of a box yields its first row. all boxes get as many slots as the largest box, the slots beyond a smaller box are masked.
+    '''
+    col_start = np.maximum((left - C.Brick.SLOT_START_X) // C.Brick.SLOT_WIDTH, 0).astype(np.intp)
+    col_end = np.minimum((right - C.Brick.SLOT_START_X) // C.Brick.SLOT_WIDTH, self.cols - 1).astype(np.intp)
+    row_start = np.maximum((C.Brick.SLOT_START_Y - top) // C.Brick.SLOT_HEIGTH, 0).astype(np.intp)
+    row_end = np.minimum((C.Brick.SLOT_START_Y - bottom) // C.Brick.SLOT_HEIGTH, self.rows - 1).astype(np.intp)
+
+    span_rows = int(np.max(row_end - row_start, initial=-1)) + 1
+    span_cols = int(np.max(col_end - col_start, initial=-1)) + 1
+    if span_rows <= 0 or span_cols <= 0:
+      return np.zeros((len(left), 0), dtype=np.intp), np.zeros((len(left), 0), dtype=bool)
+
+    rows = row_start[:, None, None] + np.arange(span_rows)[None, :, None]
+    cols = col_start[:, None, None] + np.arange(span_cols)[None, None, :]
+    valid = (rows <= row_end[:, None, None]) & (cols <= col_end[:, None, None])
+    cells = np.where(valid, rows * self.cols + cols, 0).reshape(len(left), -1)
+    valid = valid.reshape(len(left), -1) & self.alive.reshape(-1)[cells]
+
+    return cells, valid
+
+  def collide(self, x: np.ndarray, y: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+      returns every touch between a ball and a live brick as the position of the ball in the given arrays, the slot of the brick and the side of the brick that was hit. a side is hit if the distance between the center of the ball and the line of the side is smaller than the radius while the center lies within the extent of the side. bottom and top are checked before left and right.
+    '''
+    cells, valid = self._candidates(x - radius, y - radius, x + radius, y + radius)
+    if not valid.any():
+      return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int8)
+
+    left = self.x.reshape(-1)[cells]
+    bottom = self.y.reshape(-1)[cells]
+    right = left + self.width.reshape(-1)[cells]
+    top = bottom + self.height.reshape(-1)[cells]
+    x = x[:, None]
+    y = y[:, None]
+
+    within_x = (left <= x) & (right >= x)
+    within_y = (bottom <= y) & (top >= y)
+
+    side = np.select(
+      [within_x & (np.abs(bottom - y) < radius), within_x & (np.abs(top - y) < radius), within_y & (np.abs(left - x) < radius), within_y & (np.abs(right - x) < radius)],
+      [Side.BOTTOM, Side.TOP, Side.LEFT, Side.RIGHT],
+      Side.NONE
+    )
+    ball, slot = np.nonzero(valid & (side != Side.NONE))
+
+    return ball, cells[ball, slot], side[ball, slot].astype(np.int8)
+
+  def collide_one(self, x: float, y: float, radius: float) -> tuple[np.ndarray, np.ndarray]:
+    '''
+      `collide()` for a single ball. returns the slots of the touched bricks and the sides that were hit.
+    '''
+    if y - radius > self._top or y + radius < self._bottom:
+      return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int8)
+
+    rows, cols = self._window(x - radius, y - radius, x + radius, y + radius)
+    if rows.start >= rows.stop or cols.start >= cols.stop or not self.alive[rows, cols].any():
+      return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int8)
+
+    left = self.x[rows, cols]
+    bottom = self.y[rows, cols]
+    right = left + self.width[rows, cols]
+    top = bottom + self.height[rows, cols]
+
+    within_x = (left <= x) & (right >= x)
+    within_y = (bottom <= y) & (top >= y)
+
+    side = np.select(
+      [within_x & (np.abs(bottom - y) < radius), within_x & (np.abs(top - y) < radius), within_y & (np.abs(left - x) < radius), within_y & (np.abs(right - x) < radius)],
+      [Side.BOTTOM, Side.TOP, Side.LEFT, Side.RIGHT],
+      Side.NONE
+    )
+    hit_rows, hit_cols = np.nonzero(self.alive[rows, cols] & (side != Side.NONE))
+
+    return (hit_rows + rows.start) * self.cols + hit_cols + cols.start, side[hit_rows, hit_cols].astype(np.int8)
+
+  def sweep(self, x: np.ndarray, y: np.ndarray, dx: np.ndarray, dy: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None:
+    '''
+      returns for every ball the fraction of its movement (dx, dy) after which it touches the first live brick on its path, the normal of the touched surface and the slot of the brick. the slot is -1 and the fraction infinite if no brick is on the path. only the slots overlapped by the bounding box of each path are tested. returns None if no ball comes near a brick.
+    '''
+    bottom = np.minimum(y, y + dy) - radius
+    #most of the time all balls are below the bricks, which is cheaper to check than gathering the slots around every ball.
+    if bottom.min() > self._top:
+      return None
+    top = np.maximum(y, y + dy) + radius
+    if top.max() < self._bottom:
+      return None
+
+    cells, valid = self._candidates(np.minimum(x, x + dx) - radius, bottom, np.maximum(x, x + dx) + radius, top)
+    near = np.flatnonzero(valid.any(axis=1))
+    if len(near) == 0:
+      return None
+
+    t = np.full(len(x), inf)
+    normal_x = np.zeros(len(x))
+    normal_y = np.zeros(len(x))
+    cell = np.full(len(x), -1, dtype=np.intp)
+
+    cells = cells[near]
+    left = self.x.reshape(-1)[cells]
+    bottom = self.y.reshape(-1)[cells]
+    t_all, normal_x_all, normal_y_all = sweep_circle_rect(x[near, None], y[near, None], dx[near, None], dy[near, None], radius, left, bottom, left + self.width.reshape(-1)[cells], bottom + self.height.reshape(-1)[cells])
+    t_all = np.where(valid[near], t_all, inf)
+
+    first = np.argmin(t_all, axis=1)
+    rows = np.arange(len(near))
+    t[near] = t_all[rows, first]
+    normal_x[near] = normal_x_all[rows, first]
+    normal_y[near] = normal_y_all[rows, first]
+    cell[near] = np.where(t[near] < inf, cells[rows, first], -1)
+
+    return t, normal_x, normal_y, cell
+
+  def sweep_one(self, x: float, y: float, dx: float, dy: float, radius: float) -> tuple[float, float, float, int]:
+    '''
+      `sweep()` for a single ball with plain floats. only the few slots overlapped by the bounding box of the path are tested, one by one with `sweep_circle_rect_one()`. they are visited row by row like `np.argmin()` in the array version, so a tie is resolved the same way.
+    '''
+    if min(y, y + dy) - radius > self._top or max(y, y + dy) + radius < self._bottom:
+      return inf, 0.0, 0.0, -1
+
+    rows, cols = self._window(min(x, x + dx) - radius, min(y, y + dy) - radius, max(x, x + dx) + radius, max(y, y + dy) + radius)
+    first = (inf, 0.0, 0.0, -1)
+    for row in range(rows.start, rows.stop):
+      for cell in range(row * self.cols + cols.start, row * self.cols + cols.stop):
+        rect = self._rects[cell]
+        if rect is None:
+          continue
+        t, normal_x, normal_y = sweep_circle_rect_one(x, y, dx, dy, radius, *rect)
+        if t < first[0]:
+          first = (t, normal_x, normal_y, cell)
+
+    return first
+
+class Target:
+  WORLD = 0
+  PADDLE = 1
+  BRICK = 2
+
+class Game:
+  '''
+    state and physics of a game of breakout without any window, drawing or sensor. `step()` advances the game by one physics tick, so the game can be driven by the window at a fixed rate or headless as fast as possible. views subclass it and react to `_next_level()` and `_remove_brick()`. the game is over when the last ball is lost.
+  '''
+  def __init__(self, levels: list | None = None, seed: int | None = None, balls: int = 1) -> None:
+    self.levels = levels if levels is not None else [C.Level1, C.Level2, C.Level3]
+    self.seed = seed
+    self.start_balls = balls
+    self.init()
+
+  def init(self) -> None:
+    self.level = 1
+    self.score = 0
+    self.ticks = 0
+    self.bounces = 0
+    self.over = False
+    self.cleared = False
+
+    self.world = World()
+    self.paddle = Paddle(C.Paddle.VELOCITY)
+    self.balls = Balls(self.start_balls)
+    self._init_bricks(self.levels[0].MAP)
+
+    #a seed varies where and in which direction the balls start. without a seed every game starts the same and several balls are spread evenly over the paddle.
+    rng = random.Random(self.seed)
+    for index in range(self.start_balls):
+      if self.seed is not None:
+        offset = rng.uniform(-C.Ball.START_VARIATION, C.Ball.START_VARIATION)
+        dir_x = rng.choice((-1, 1))
+      else:
+        offset = C.Ball.START_VARIATION * (2 * index / (self.start_balls - 1) - 1) if self.start_balls > 1 else 0
+        dir_x = C.Ball.START_DIR_X if index % 2 == 0 else -C.Ball.START_DIR_X
+      self.spawn_ball(C.Ball.START_X + offset, C.Ball.START_Y, dir_x, C.Ball.START_DIR_Y)
+
+  def spawn_ball(self, x: float, y: float, dir_x: float, dir_y: float) -> int:
+    '''
+      adds a ball with the velocity of the current level, e.g. for a multiball power-up. returns the index of the ball.
+    '''
+    return self.balls.add(x, y, dir_x, dir_y, self.levels[self.level - 1].BALL_VELOCITY)
+
+  def _init_bricks(self, bricks_map: list[list]) -> None:
+    self.bricks = BrickStore(len(bricks_map), max(len(row) for row in bricks_map))
+
+    for row_key, row_val in enumerate(bricks_map):
+      for col_key, col_val in enumerate(row_val):
+        if col_val is not None:
+          x = C.Brick.START_X + col_key * C.Brick.WIDTH + (col_key - 1) * C.Brick.GAP
+          y = C.Brick.START_Y - row_key * C.Brick.HEIGTH - (row_key - 1) * C.Brick.GAP
+          self.bricks.insert(row_key, col_key, x, y, col_val)
+  
+  def step(self, acc_x: float, on_game_over: Callable[[], None] | None = None) -> None:
+    '''
+      advances the simulation by one physics tick. a finished game sets `over` and calls `on_game_over`, further ticks are ignored.
+    '''
+    if self.over:
+      return
+
+    self.ticks = self.ticks + 1
+    self._on_game_over = on_game_over
+
+    #numpy only pays off for many balls, a few balls are moved one by one with plain floats.
+    if C.Physics.SWEPT:
+      self.paddle.move(acc_x, self.world, self.balls)
+      index = self.balls.alive()
+      if len(index) <= C.Physics.SCALAR_BALLS:
+        self._sweep_few(index.tolist())
+      else:
+        self._sweep_balls(index)
+    else:
+      self.paddle.move(acc_x, self.world)
+      index = self.balls.alive()
+      if len(index) <= C.Physics.SCALAR_BALLS:
+        cells = []
+        for i in index.tolist():
+          self._check_collisions_one(i, cells)
+        self._remove_bricks(cells)
+      else:
+        self.balls.move()
+        self._check_collisions(index)
+
+    if not self.balls.active[:self.balls.count].any():
+      self._game_over()
+
+    elif len(self.bricks) == 0:
+      if len(self.levels) == self.level:
+        self.cleared = True
+        self._game_over()
+      else:
+        self._next_level()
+
+  def _game_over(self) -> None:
+    self.over = True
+    if self._on_game_over is not None:
+      self._on_game_over()
+
+  def _next_level(self) -> None:
+    self.level = self.level + 1
+    self.balls.velocity[:self.balls.count] = self.levels[self.level - 1].BALL_VELOCITY
+    self._init_bricks(self.levels[self.level - 1].MAP)
+
+  def _remove_brick(self, cell: int) -> None:
+    self.bricks.remove(cell)
+    self.score = self.score + 1
+
+  def _remove_bricks(self, cells: np.ndarray | list[int]) -> None:
+    #several balls can hit the same brick in one tick, it is removed once.
+    for cell in sorted(set(cells.tolist() if isinstance(cells, np.ndarray) else cells)):
+      self._remove_brick(cell)
+
+  def _check_collisions_one(self, i: int, hit_cells: list[int]) -> None:
+    '''
+      moves the single ball i and resolves its collisions like `_check_collisions()`. the bricks that were hit are added to `hit_cells` and removed after all balls moved, so that every ball of the tick sees the same bricks like in the array version.
+    '''
+    balls = self.balls
+    radius_sq = balls.radius_sq
+    x = balls.prev_x[i] = float(balls.x[i])
+    y = balls.prev_y[i] = float(balls.y[i])
+    x = x + float(balls.dir_x[i]) * float(balls.velocity[i])
+    y = y + float(balls.dir_y[i]) * float(balls.velocity[i])
+    balls.x[i] = x
+    balls.y[i] = y
+
+    world = self.world
+    if (x - world.left) ** 2 < radius_sq or (x - world.right) ** 2 < radius_sq:
+      balls.dir_x[i] = -balls.dir_x[i]
+    elif (y - world.top) ** 2 < radius_sq:
+      balls.dir_y[i] = -balls.dir_y[i]
+    elif (y - world.bottom) ** 2 < radius_sq:
+      balls.active[i] = False
+
+    if self.paddle.collides_with_one(balls, i):
+      self.bounces = self.bounces + 1
+
+    cells, sides = self.bricks.collide_one(x, y, balls.radius)
+    if len(cells) == 0:
+      return
+
+    #the ball bounces only once per axis, even if it hits two neighbouring bricks on the same side in one tick.
+    if np.any(sides <= Side.TOP):
+      balls.dir_y[i] = -balls.dir_y[i]
+    if np.any(sides >= Side.LEFT):
+      balls.dir_x[i] = -balls.dir_x[i]
+
+    hit_cells.extend(cells.tolist())
+
+  def _check_collisions(self, index: np.ndarray) -> None:
+    balls = self.balls
+
+    lost = self.world.collides_with(balls, index)
+    balls.active[index[lost]] = False
+
+    self.bounces = self.bounces + int(np.count_nonzero(self.paddle.collides_with(balls, index)))
+
+    ball, cells, sides = self.bricks.collide(balls.x[index], balls.y[index], balls.radius)
+    if len(cells) == 0:
+      return
+
+    #a ball bounces only once per axis, even if it hits two neighbouring bricks on the same side in one tick.
+    balls.dir_y[np.unique(index[ball[sides <= Side.TOP]])] *= -1
+    balls.dir_x[np.unique(index[ball[sides >= Side.LEFT]])] *= -1
+
+    self._remove_bricks(cells)
+
+  def _sweep_few(self, index: list[int]) -> None:
+    '''
+      `_sweep_balls()` for a few balls with plain floats, which is several times faster than the arrays. like there, every pass moves each ball to its next impact and the bricks that were hit are removed after the pass, so both give the same game.
+    '''
+    balls = self.balls
+    moving = []
+    for i in index:
+      #only active balls are moved, therefore only their previous position is updated. lost balls are not drawn.
+      x = balls.prev_x[i] = float(balls.x[i])
+      y = balls.prev_y[i] = float(balls.y[i])
+      moving.append([i, x, y, float(balls.dir_x[i]), float(balls.dir_y[i]), float(balls.velocity[i]), 1.0])
+
+    for _ in range(C.Physics.MAX_IMPACTS):
+      if not moving:
+        return
+
+      cells = []
+      moving = [ball for ball in moving if self._sweep_ball(ball, cells)]
+      self._remove_bricks(cells)
+
+  def _sweep_ball(self, ball: list, hit_cells: list[int]) -> bool:
+    '''
+      moves a ball of `_sweep_few()` to its next impact or the end of its path. the state of the ball is updated in place, bricks that were hit are added to `hit_cells`. returns True if the ball bounced and has a rest of its path left.
+    '''
+    balls = self.balls
+    radius = balls.radius
+    i, x, y, dir_x, dir_y, velocity, remaining = ball
+    dx = dir_x * velocity * remaining
+    dy = dir_y * velocity * remaining
+
+    t, normal_x, normal_y = self.world.sweep_one(x, y, dx, dy, radius)
+    target = Target.WORLD
+    cell = -1
+
+    t_paddle, paddle_normal_x, paddle_normal_y = self.paddle.sweep_one(x, y, dx, dy, radius)
+    if t_paddle < t:
+      t, normal_x, normal_y = t_paddle, paddle_normal_x, paddle_normal_y
+      target = Target.PADDLE
+
+    t_brick, brick_normal_x, brick_normal_y, brick_cell = self.bricks.sweep_one(x, y, dx, dy, radius)
+    if t_brick < t:
+      t, normal_x, normal_y = t_brick, brick_normal_x, brick_normal_y
+      target = Target.BRICK
+      cell = brick_cell
+
+    hit = t <= 1
+    if not hit:
+      t = 1.0
+    balls.x[i] = ball[1] = x + dx * t
+    balls.y[i] = ball[2] = y + dy * t
+
+    if not hit:
+      return False
+
+    if target == Target.WORLD and normal_y > 0:
+      balls.active[i] = False
+      return False
+
+    dot = dir_x * normal_x + dir_y * normal_y
+    dir_x = dir_x - 2 * dot * normal_x
+    dir_y = dir_y - 2 * dot * normal_y
+
+    #a side of the paddle only reflects dir_x. the ball keeps moving up or down and can always leave the gap between the paddle and a wall, while the paddle can not move into it.
+    if target == Target.PADDLE:
+      self.bounces = self.bounces + 1
+
+    if target == Target.BRICK:
+      hit_cells.append(cell)
+
+    balls.dir_x[i] = ball[3] = dir_x
+    balls.dir_y[i] = ball[4] = dir_y
+    ball[6] = remaining * (1 - t)
+
+    return True
+
+  def _sweep_balls(self, index: np.ndarray) -> None:
+    '''
+      moves every ball along its path of one tick and stops it at the first wall, brick or paddle on the way. the ball is reflected there and travels the rest of the path in the new direction. a fast ball can therefore neither tunnel through a brick nor hit a side that is hidden behind another brick, and the paddle does not need its immunity. all balls are swept together, balls that hit something are swept again with the rest of their path.
+    '''
+    balls = self.balls
+    n = balls.count
+    balls.prev_x[:n] = balls.x[:n]
+    balls.prev_y[:n] = balls.y[:n]
+    remaining = np.ones(len(index))
+
+    for _ in range(C.Physics.MAX_IMPACTS):
+      if len(index) == 0:
+        return
+
+      x = balls.x[index]
+      y = balls.y[index]
+      dx = balls.dir_x[index] * balls.velocity[index] * remaining
+      dy = balls.dir_y[index] * balls.velocity[index] * remaining
+
+      t, normal_x, normal_y = self.world.sweep(x, y, dx, dy, balls.radius)
+      target = np.full(len(index), Target.WORLD, dtype=np.int8)
+
+      paddle_hit = self.paddle.sweep(x, y, dx, dy, balls.radius)
+      if paddle_hit is not None:
+        t_paddle, paddle_normal_x, paddle_normal_y = paddle_hit
+        closer = t_paddle < t
+        t = np.where(closer, t_paddle, t)
+        normal_x = np.where(closer, paddle_normal_x, normal_x)
+        normal_y = np.where(closer, paddle_normal_y, normal_y)
+        target[closer] = Target.PADDLE
+
+      brick_hit = self.bricks.sweep(x, y, dx, dy, balls.radius)
+      if brick_hit is not None:
+        t_brick, brick_normal_x, brick_normal_y, cells = brick_hit
+        closer = t_brick < t
+        t = np.where(closer, t_brick, t)
+        normal_x = np.where(closer, brick_normal_x, normal_x)
+        normal_y = np.where(closer, brick_normal_y, normal_y)
+        target[closer] = Target.BRICK
+
+      hit = t <= 1
+      t = np.where(hit, t, 1)
+      balls.x[index] = x + dx * t
+      balls.y[index] = y + dy * t
+
+      lost = hit & (target == Target.WORLD) & (normal_y > 0)
+      balls.active[index[lost]] = False
+
+      bounced = hit & ~lost
+      balls.reflect(index[bounced], normal_x[bounced], normal_y[bounced])
+
+      paddle = bounced & (target == Target.PADDLE)
+      #like in `_sweep_ball()`, a side of the paddle only reflects dir_x.
+      self.bounces = self.bounces + int(np.count_nonzero(paddle))
+
+      if brick_hit is not None:
+        self._remove_bricks(cells[bounced & (target == Target.BRICK)])
+
+      remaining = remaining[bounced] * (1 - t[bounced])
+      index = index[bounced]
+
+class T_Simulation_Result(TypedDict):
+  level: int
+  score: int
+  ticks: int
+  bounces: int
+  cleared: bool
+
+def simulate(acc_x: Iterable[float] | Callable[[Game], float], levels: list | None = None, max_ticks: int = 100_000, seed: int | None = None, balls: int = 1) -> T_Simulation_Result:
+  '''
+    plays one game headless as fast as possible. the paddle is either driven by a stream of acc_x values, e.g. recorded from the M5Stack or scripted, or by a policy that returns acc_x for the current state of the game. the game ends when it is over, the stream is exhausted or after `max_ticks` ticks.
+  '''
+  game = Game(levels, seed, balls)
+
+  if callable(acc_x):
+    while not game.over and game.ticks < max_ticks:
+      game.step(acc_x(game))
+  else:
+    for value in acc_x:
+      if game.over or game.ticks >= max_ticks:
+        break
+      game.step(value)
+
+  return {
+    'level': game.level,
+    'score': game.score,
+    'ticks': game.ticks,
+    'bounces': game.bounces,
+    'cleared': game.cleared
+  }
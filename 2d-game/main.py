@@ -1,17 +1,21 @@
 import os
-from typing import Callable, TypedDict
+from typing import TypedDict
 from enum import Enum
 
-from DIPPID import SensorUDP
+import numpy as np
+
+from time import monotonic
+
+from DIPPID import SensorUDP, SensorUDPAsync, Pipeline, Offset, DeadZone, EMA, RateLimit, Clamp, Predictor
 from pyglet import window, app, image
 from pyglet.text import Label
 from pyglet.sprite import Sprite
 from pyglet.shapes import *
 from pyglet.graphics import Batch
-from pyglet.math import Vec2
-from pyglet.clock import schedule_once
+from pyglet.clock import schedule_interval
 
 import configuration as C
+import engine
 
 '''
   Ideas for Naming:
@@ -32,179 +36,78 @@ class AppState(Enum):
   END = 3
   EXIT = 4
 
-class Ball(Circle):
-
-  def __init__(self, velocity: float, batch: Batch) -> None:
-    super().__init__(x=C.Ball.START_X, y=C.Ball.START_Y, radius=C.Ball.RADIUS, color=C.Colour.BALL, batch=batch)
-    self.dir_x = C.Ball.START_DIR_X
-    self.dir_y = C.Ball.START_DIR_Y
-    self.velocity = velocity
-
-  def move(self) -> None:
-    self.x = self.x + (self.dir_x * self.velocity)
-    self.y = self.y + (self.dir_y * self.velocity)
-
-  def change_dir_x(self, direction=-1) -> None:
-    self.dir_x = self.dir_x * direction
-
-  def change_dir_y(self, direction=-1) -> None:
-    self.dir_y = self.dir_y * direction
-
-  def check_distance(self, p_1: Vec2, p_2: Vec2) -> bool:
-    '''
-      calculate the distance between a side represented by two vectors and the ball. reducing the distance between the side and the center of the ball by the radius of the ball, yields if the ball collided with a side.
-    '''
-    ball_to_p1 = Vec2(p_1.x - self.x, p_1.y - self.y)
-    ball_to_p2 = Vec2(p_2.x - self.x, p_2.y - self.y)
-
-    cross_product = ball_to_p1.x * ball_to_p2.y - ball_to_p1.y * ball_to_p2.x
-
-    distance = abs(cross_product) / ball_to_p1.distance(ball_to_p2)
-
-    return distance - self.radius < 0
-
-class World:
-  def __init__(self) -> None:
-    self.top_left = Vec2(C.World.START_X, C.World.END_Y)
-    self.top_right = Vec2(C.World.END_X, C.World.END_Y)
-    self.bot_left = Vec2(C.World.START_X, C.World.START_Y)
-    self.bot_right = Vec2(C.World.END_X, C.World.START_Y)
-
-  def collides_with(self, ball: Ball, on_game_over: Callable[[], None]) -> None:
-    if ball.check_distance(self.bot_left, self.top_left):
-      ball.change_dir_x()
-
-    elif ball.check_distance(self.bot_right, self.top_right):
-      ball.change_dir_x()
-
-    elif ball.check_distance(self.top_left, self.top_right):
-      ball.change_dir_y()
-
-    elif ball.check_distance(self.bot_left, self.bot_right):
-      on_game_over()
-
-class Paddle(Rectangle):
-
-  def __init__(self, velocity: float, batch: Batch) -> None:
-    super().__init__(x=C.Paddle.START_X, y=C.Paddle.START_Y, width=C.Paddle.WIDTH, height=C.Paddle.HEIGTH, color=C.Colour.PADDLE, batch=batch)
-    self._velocity = velocity
-    '''
-      after the paddle is hit it get immunity to interaction with the ball, therefore there are no possible further bounces in a defined timeframe. this is due to a bug where the ball sticks and flows over the paddle when it hit the paddle in a certain angle while the paddle is moving. immunity enforces that the ball left the area until the paddle can interact again.
-    '''
-    self._immunity = False
-
-  def move(self, acc_x: float, world: World) -> None:
-    new_x = self.x + (acc_x * self._velocity)
-
-    if new_x >= world.bot_left.x and new_x <= world.bot_right.x - self.width:
-      self.x = new_x
-
-  def _reset_immunity(self, dt) -> None:
-    self._immunity = False
-
-  def collides_with(self, ball: Ball) -> None:
-    if self._immunity:
-      return
-    
-    v_top_right = Vec2(self.x + self.width, self.y + self.height)
-    v_top_left = Vec2(self.x, self.y + self.height)
-    v_bot_left = Vec2(self.x, self.y)
-    v_bot_right = Vec2(self.x + self.width, self.y)
-
-    if ball.check_distance(v_top_left, v_top_right) and self.x <= ball.x and self.x + self.width >= ball.x:
-        ball.change_dir_y()
-        self._immunity = True
-        schedule_once(func=self._reset_immunity, delay=C.Paddle.IMMUNITY)
-
-    #hitting the ball with the sides of the paddle pushes it straight back instead of bouncing it of with the negative angle which would lead to game over.
-    elif (ball.check_distance(v_bot_left, v_top_left) or ball.check_distance(v_bot_right, v_top_right)) and self.y <= ball.y and self.y + self.height >= ball.y:
-      ball.change_dir_y()
-      ball.change_dir_x()
-
-      self._immunity = True
-      schedule_once(func=self._reset_immunity, delay=C.Paddle.IMMUNITY)
-
 class Brick(Rectangle):
 
   def __init__(self, x: float, y: float, colour: tuple[int, int, int], batch: Batch) -> None:
     super().__init__(x=x, y=y, width=C.Brick.WIDTH, height=C.Brick.HEIGTH, color=colour, batch=batch)
 
-  def collides_with(self, ball: Ball) -> bool:
-    v_bot_left = Vec2(self.x, self.y)
-    v_bot_right = Vec2(self.x + self.width, self.y)
-    v_top_right = Vec2(self.x + self.width, self.y + self.height)
-    v_top_left = Vec2(self.x, self.y + self.height)
-    
-    if ball.check_distance(v_bot_left, v_bot_right) and v_bot_left.x <= ball.x and v_bot_right.x >= ball.x:
-      ball.change_dir_y()
-      self.delete()
-
-      return True
-
-    elif ball.check_distance(v_top_left, v_top_right) and v_top_left.x <= ball.x and v_top_right.x >= ball.x:
-      ball.change_dir_y()
-      self.delete()
-
-      return True
-
-    elif ball.check_distance(v_bot_left, v_top_left) and v_bot_left.y <= ball.y and v_top_left.y >= ball.y:
-        ball.change_dir_x()
-        self.delete()
-
-        return True
-          
-    elif ball.check_distance(v_bot_right, v_top_right) and v_bot_right.y <= ball.y and v_top_right.y >= ball.y:
-        ball.change_dir_x()
-        self.delete()
-
-        return True
-
-    return False
-
 class Input:
 
   T_Input_State = TypedDict('InputState', { 'acc_x': float, 'button_1': bool, 'button_2': bool })
 
   def __init__(self) -> None:
-    self._sensor = SensorUDP(C.Input.PORT)
+    self._sensor = SensorUDPAsync(C.Input.PORT) if C.Input.ASYNC else SensorUDP(C.Input.PORT, coalesce=C.Input.COALESCE)
+    #the x tilt is filtered on the sensor side for every sample that arrives, also for the samples between two frames.
+    self._sensor.add_filter('acc_x', 'accelerometer', Pipeline(
+      Offset(C.Input.OFFSET),
+      DeadZone(C.Input.DEAD_ZONE),
+      EMA(C.Input.EMA_ALPHA),
+      RateLimit(C.Input.MAX_STEP),
+      Clamp(-C.Input.CLAMP, C.Input.CLAMP)
+    ), field='x')
+    #acc_x is extrapolated from its newest samples to the time the frame will be shown.
+    self._predictor = Predictor(self._sensor.enable_history('acc_x', C.Input.HISTORY_SIZE), C.Input.PREDICTION_WINDOW, C.Input.MAX_PREDICTION / 1000) if C.Input.PREDICT else None
+    #acc_x and the buttons are converted to floats once when they arrive and published together as one record.
+    self._sensor.enable_snapshot({ 'acc_x': 'acc_x', 'button_1': 'button_1', 'button_2': 'button_2' })
+    self._seq = -1
     self._button_pressed = {
       'button_1': False,
       'button_2': False
     }
 
-  def _get_acc_x(self) -> float:
+  def _get_acc_x(self, snapshot) -> float:
     '''
-      sensor might return a None value that raises an exception when trying to cast to float returning 0 in the case.
+      returns the filtered x tilt of the snapshot, extrapolated to the time the frame is shown if the prediction is turned on. the snapshot is 0.0 until the first sample arrived.
     '''
-    try:
-      return float(self._sensor.get_value('accelerometer')['x'])
-    except:
-      return 0
-  
-  def _get_button(self, button_name: str) -> bool:
+    if self._predictor:
+      predicted = self._predictor.predict(monotonic() + C.Input.PREDICTION_HORIZON / 1000)
+
+      if predicted is not None:
+        return max(-C.Input.CLAMP, min(C.Input.CLAMP, predicted))
+
+    return snapshot.acc_x
+
+  def _get_button(self, button_name: str, pressed: bool) -> bool:
     '''
-      returns boolean value that indicates if button_1 from M5Stack was pressed. if M5Stack returns a value that can not be type cast to boolean, it returns `False`. As M5Stack returns `True` as long as a button is held, therefore button_1_pressed was introduced. all `True` values except the first and until the button is released are turned to `False`. Therefore get_button_1 only returns `True` once for the switch from not pressed to pressed. button_1 is used to quit the game and only one `True` value is required for that.
+      returns boolean value that indicates if button_1 from M5Stack was pressed. As M5Stack returns `True` as long as a button is held, therefore button_1_pressed was introduced. all `True` values except the first and until the button is released are turned to `False`. Therefore get_button_1 only returns `True` once for the switch from not pressed to pressed. button_1 is used to quit the game and only one `True` value is required for that.
     '''
-    try:
-      pressed = bool(self._sensor.get_value(button_name))
+    if pressed and not self._button_pressed[button_name]:
+      self._button_pressed[button_name] = True
+
+      return True
 
-      if pressed and not self._button_pressed[button_name]:
-        self._button_pressed[button_name] = True
+    elif not pressed and self._button_pressed[button_name]:
+      self._button_pressed[button_name] = False
 
-        return True
-      
-      elif not pressed and self._button_pressed[button_name]:
-        self._button_pressed[button_name] = False
+    return False
 
-      return False
+  def get_prediction_stats(self) -> dict | None:
+    '''
+      error of the prediction measured on the samples that arrived, None if the prediction is turned off.
+    '''
+    return self._predictor.get_stats() if self._predictor else None
 
-    except:
-      return False
-  
   def get_state(self) -> T_Input_State:
-    acc_x = self._get_acc_x()
-    button_1 = self._get_button('button_1')
-    button_2 = self._get_button('button_2')
+    snapshot = self._sensor.get_snapshot()
+    acc_x = self._get_acc_x(snapshot)
+
+    #the buttons can only switch when a new snapshot arrived.
+    if snapshot.seq == self._seq:
+      return { 'acc_x': acc_x, 'button_1': False, 'button_2': False }
+
+    self._seq = snapshot.seq
+    button_1 = self._get_button('button_1', bool(snapshot.button_1))
+    button_2 = self._get_button('button_2', bool(snapshot.button_2))
 
     return {
       'acc_x': acc_x,
@@ -255,60 +158,51 @@ class Menu:
   def show_intro(self) -> None:
     self._intro_sprite.draw()
 
-class Game:
-
+class Game(engine.Game):
+  '''
+    draws a game of the engine with pyglet. the shapes of the balls and the paddle are moved between the last two physics ticks when a frame is drawn, the shapes of the bricks are deleted together with their bricks. a circle is created for every ball that is spawned and hidden when the ball is lost.
+  '''
   def init(self) -> None:
-    self.levels = [C.Level1, C.Level2, C.Level3]
-    self.level = 1
-    self.score = 0
-
     self.batch = Batch()
-    self.world = World()
     self.hud = HUD(self.batch)
-    self.ball = Ball(self.levels[0].BALL_VELOCITY, self.batch)
-    self.paddle = Paddle(C.Paddle.VELOCITY, self.batch)
-    self.bricks = []
-    self._init_bricks(self.levels[0].MAP)
+    super().init()
+    self.ball_shapes: list[Circle] = []
+    self.paddle_shape = Rectangle(x=self.paddle.x, y=self.paddle.y, width=self.paddle.width, height=self.paddle.height, color=C.Colour.PADDLE, batch=self.batch)
 
   def _init_bricks(self, bricks_map: list[list]) -> None:
-    self.bricks = []
-
-    for row_key, row_val in enumerate(bricks_map):
-      for col_key, col_val in enumerate(row_val):
-        if col_val is not None:
-          x = C.Brick.START_X + col_key * C.Brick.WIDTH + (col_key - 1) * C.Brick.GAP
-          y = C.Brick.START_Y - row_key * C.Brick.HEIGTH - (row_key - 1) * C.Brick.GAP
-          self.bricks.append(Brick(x=x, y=y, colour=col_val, batch=self.batch))
-  
-  def run(self, acc_x: float, on_game_over: Callable[[], None]) -> None:
-    self.paddle.move(acc_x, self.world)
-    self.ball.move()
-
-    self._check_collisions(on_game_over)
+    super()._init_bricks(bricks_map)
+    self.brick_shapes: list[Brick | None] = [None] * (self.bricks.rows * self.bricks.cols)
 
-    if len(self.bricks) == 0:
-      if len(self.levels) == self.level:
-        on_game_over()
-      else:
-        self._next_level()
-
-    self.batch.draw()
+    for row, col in zip(*np.nonzero(self.bricks.alive)):
+      colour = tuple(int(channel) for channel in self.bricks.colour[row, col])
+      self.brick_shapes[row * self.bricks.cols + col] = Brick(x=float(self.bricks.x[row, col]), y=float(self.bricks.y[row, col]), colour=colour, batch=self.batch)
 
   def _next_level(self) -> None:
-    self.level = self.level + 1
+    super()._next_level()
     self.hud.update_level(self.level)
-    self.ball.velocity = self.levels[self.level - 1].BALL_VELOCITY
-    self._init_bricks(self.levels[self.level - 1].MAP)
 
+  def _remove_brick(self, cell: int) -> None:
+    super()._remove_brick(cell)
+    self.brick_shapes[cell].delete()
+    self.brick_shapes[cell] = None
+    self.hud.update_score(self.score)
+
+  def draw(self, alpha: float) -> None:
+    '''
+      draws the game between the last two physics ticks. alpha is the fraction of a tick that passed since the last tick.
+    '''
+    balls = self.balls
+    while len(self.ball_shapes) < balls.count:
+      self.ball_shapes.append(Circle(x=0, y=0, radius=balls.radius, color=C.Colour.BALL, batch=self.batch))
+
+    x = balls.prev_x[:balls.count] + (balls.x[:balls.count] - balls.prev_x[:balls.count]) * alpha
+    y = balls.prev_y[:balls.count] + (balls.y[:balls.count] - balls.prev_y[:balls.count]) * alpha
+    for index, shape in enumerate(self.ball_shapes):
+      shape.visible = bool(balls.active[index])
+      shape.position = (float(x[index]), float(y[index]))
 
-  def _check_collisions(self, on_game_over: Callable[[], None]) -> None:
-    self.world.collides_with(self.ball, on_game_over)
-    self.paddle.collides_with(self.ball)
-    for brick in self.bricks:
-      if brick.collides_with(self.ball):
-        self.bricks.remove(brick)
-        self.score = self.score + 1
-        self.hud.update_score(self.score)
+    self.paddle_shape.x = self.paddle.prev_x + (self.paddle.x - self.paddle.prev_x) * alpha
+    self.batch.draw()
 
 class Application():
 
@@ -318,20 +212,24 @@ class Application():
     self.on_draw = self.window.event(self.on_draw)
     
     self.input = Input()
-    self.game = Game()
+    self.game = Game(balls=C.Ball.COUNT)
     self.menu = Menu()
     self.input_state = self.input.get_state()
     self.app_state = AppState.START
+    '''
+      the simulation runs with a fixed timestep that is independent of the frame rate. every frame the elapsed time is added to the accumulator and as many physics ticks as fit into it are run. the rest of the accumulator is used to draw the game between the last two ticks.
+    '''
+    self._accumulator = 0.0
+    #schedule() would call _update() on every pass of the event loop, so the loop never sleeps. once per timestep is enough, dt still carries the real elapsed time.
+    schedule_interval(self._update, C.Physics.TIMESTEP)
   
   def run(self) -> None:
-    app.run()
+    app.run(1 / C.Window.FPS)
 
   def _on_game_over(self) -> None:
     self.app_state = AppState.END
 
-  def on_draw(self) -> None:
-    self.window.clear()
-
+  def _update(self, dt: float) -> None:
     self.input_state = self.input.get_state()
 
     #process button presses
@@ -341,6 +239,20 @@ class Application():
     elif self.input_state['button_2']:
       self.app_state = AppState.GAME
       self.game.init()
+      self._accumulator = 0.0
+
+    if self.app_state != AppState.GAME:
+      return
+
+    #a long frame (e.g. while the window is dragged) only runs a limited number of ticks, otherwise every following frame would have to catch up even more ticks.
+    self._accumulator = min(self._accumulator + dt, C.Physics.MAX_SUBSTEPS * C.Physics.TIMESTEP)
+
+    while self._accumulator >= C.Physics.TIMESTEP and self.app_state == AppState.GAME:
+      self.game.step(self.input_state['acc_x'], self._on_game_over)
+      self._accumulator = self._accumulator - C.Physics.TIMESTEP
+
+  def on_draw(self) -> None:
+    self.window.clear()
 
     #appstate defines if intro, game or game_end screen is shown
     if self.app_state == AppState.START:
@@ -351,10 +263,13 @@ class Application():
 
     elif self.app_state == AppState.EXIT:
       #Code Reference: https://stackoverflow.com/a/76374: choosing to use os._exit() here because pyglet.app.exit() does not terminate the application, while window.close() produced an error. quit() and exit() also did not work. this might be due to the event loop running in a different thread.
+      stats = self.input.get_prediction_stats()
+      if stats:
+        print(f"input prediction: {stats['predictions']} predictions, mean horizon {stats['mean_horizon'] * 1000:.1f} ms, mean absolute error {stats['mean_abs_error']:.3f}, rms error {stats['rms_error']:.3f} over {stats['samples']} samples")
       os._exit(0)
 
     elif self.app_state == AppState.GAME:
-      self.game.run(self.input_state['acc_x'], self._on_game_over)
+      self.game.draw(self._accumulator / C.Physics.TIMESTEP)
 
 application = Application()
 application.run()
\ No newline at end of file
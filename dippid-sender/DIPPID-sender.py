@@ -5,9 +5,13 @@ Notes:
 - changing credentials only worked on windows
 '''
 
-import socket, time, json, math, random
+import argparse, socket, sys, time, json, math, random
+from array import array
+from multiprocessing import Pool
 from typing import TypedDict
 
+from DIPPID import BATCH_MAX_SAMPLES, MAX_DATAGRAM_SIZE, encode_binary, encode_batch, encode_binary_many, encode_batch_many, DeltaEncoder, SEQ_KEY, TIME_KEY
+
 class Button:
   '''
     represents a M5Stack button. the states are:
@@ -84,26 +88,297 @@ class Accelerometer:
 
 IP = '127.0.0.1'
 PORT = 5700
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+#'json' sends the text format of the M5Stack, 'binary' the compact format of DIPPID.encode_binary (17 bytes per sample).
+#'batch' collects BATCH_SIZE timestamped samples and sends them in a single datagram of DIPPID.encode_batch.
+FORMAT = 'json'
+BATCH_SIZE = 10
+#json only: send just the capabilities that changed and the full state every KEYFRAME_INTERVAL-th tick.
+DELTA = False
+KEYFRAME_INTERVAL = 10
+#number every sample and add the send time, so the receiver can reject late datagrams and count lost ones.
+SEQUENCE = False
 
 TICKS_PER_SEC = 10
-LOOP_INTERVAL = 1 / TICKS_PER_SEC
-COUNTER = 0
-  
-random.seed(time.time())
-button_1 = Button()
-accelerometer = Accelerometer()
+#the last part of a wait is spent busy waiting, because time.sleep wakes up too late for rates of several kHz.
+SPIN_TIME = 0.0005
+#workers of --processes start together this long after the launch, so that no process is ahead of the others.
+START_DELAY = 0.5
 
-while True:
-  one_sec_mark = COUNTER % TICKS_PER_SEC == 0
+class T_Run_Stats(TypedDict):
+  ticks: int
+  samples: int
+  datagrams: int
+  errors: int
+  elapsed: float
+  lateness: array
 
-  accelerometer.update(COUNTER)
-  button_1.rand_switch(one_sec_mark)
-  
-  message = json.dumps({ "accelerometer": accelerometer.to_dict(), "button_1": button_1.status })
+class Device:
+  '''
+    one simulated M5Stack with a button, an accelerometer and the state of the chosen format.
+    every device sends from an own socket, so a receiver like DIPPID.SensorServer sees it as an own sender.
+  '''
+  def __init__(self, format: str = FORMAT, batch_size: int = BATCH_SIZE, delta: bool = DELTA, sequence: bool = SEQUENCE) -> None:
+    self.format = format
+    self.batch_size = batch_size
+    self.delta = delta
+    self.sequence = sequence
+    self.seq = 0
+    self.button_1 = Button()
+    self.accelerometer = Accelerometer()
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self._batch = []
+    self._delta_encoder = DeltaEncoder(KEYFRAME_INTERVAL)
+
+  def tick(self, counter: int, one_sec_mark: bool) -> bytes | None:
+    '''
+      updates the sensors and returns the datagram of this tick, or None if there is nothing to send (a batch that is not full yet or a delta without changes).
+    '''
+    self.accelerometer.update(counter)
+    self.button_1.rand_switch(one_sec_mark)
+    accelerometer = self.accelerometer
+    seq = self.seq if self.sequence else None
+
+    if self.format == 'batch':
+      self._batch.append((time.time(), accelerometer.x, accelerometer.y, accelerometer.z, self.button_1.status))
+      if len(self._batch) < self.batch_size:
+        return None
+      message = encode_batch(self._batch, buttons=1, seq=seq)
+      #batches number their samples, the other formats their datagrams.
+      self.seq += len(self._batch)
+      self._batch.clear()
+      return message
+
+    if self.format == 'binary':
+      message = encode_binary(accelerometer.x, accelerometer.y, accelerometer.z, [self.button_1.status], seq=seq, timestamp=time.time())
+    else:
+      values = { "accelerometer": accelerometer.to_dict(), "button_1": self.button_1.status }
+      if self.delta:
+        values = self._delta_encoder.encode(values)
+      if values and self.sequence:
+        values = { **values, SEQ_KEY: self.seq, TIME_KEY: time.time() }
+      message = json.dumps(values).encode() if values else None
+
+    if message:
+      self.seq += 1
+
+    return message
+
+class DeviceBank:
+  '''
+    many simulated M5Stacks at once. the frequencies, phases and noise of all accelerometers and the states of all buttons are kept in numpy arrays,
+    so the samples of every device for a tick or a whole batch of ticks are computed with a few array operations instead of three math.sin and
+    three random.uniform calls per device. the datagrams are packed in one go by DIPPID.encode_binary_many and encode_batch_many.
+
+    the signals follow Accelerometer and Button: a sine per axis with a frequency of 1 / randint(1, 100) per tick plus uniform noise, and a button that
+    toggles with a probability of 0.2 once a second. in addition every axis starts at a random phase, so the devices are not in sync.
+  '''
+  FREQ_VARIATION = 100
+  NOISE_VARIATION = 0.03
+  BUTTON_THRESHOLD = 0.8
+
+  def __init__(self, devices: int, format: str = FORMAT, batch_size: int = BATCH_SIZE, sequence: bool = SEQUENCE, seed: float | None = None) -> None:
+    import numpy as np
+    self._np = np
+    self.devices = devices
+    self.format = format
+    self.batch_size = batch_size
+    self.sequence = sequence
+    self.seq = np.zeros(devices, dtype=np.int64)
+    self.socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(devices)]
+
+    self._rng = np.random.default_rng(None if seed is None else int(seed))
+    #shape (devices, 1, 3), so that they broadcast against the ticks of a block.
+    self.freq = 1 / self._rng.integers(1, self.FREQ_VARIATION + 1, size=(devices, 1, 3))
+    self.phase = self._rng.uniform(0, 2 * math.pi, size=(devices, 1, 3))
+    self.noise = np.full((devices, 1, 3), self.NOISE_VARIATION)
+    self.buttons = np.zeros(devices, dtype=np.uint8)
+    self._times = []
+
+  def block(self, counter: int, ticks: int, ticks_per_sec: int):
+    '''
+      returns the xyz samples with the shape (devices, ticks, 3) and the button states with the shape (devices, ticks) of the ticks counter to counter + ticks - 1.
+    '''
+    np = self._np
+    t = np.arange(counter, counter + ticks)[None, :, None]
+    xyz = np.sin(2 * math.pi * self.freq * t + self.phase)
+    xyz += self.noise * self._rng.uniform(-1, 1, size=xyz.shape)
+
+    #a button can only toggle on a one second mark, the running count of toggles gives the state of every tick.
+    marks = (t[0, :, 0] % ticks_per_sec == 0)
+    toggles = np.zeros((self.devices, ticks), dtype=np.uint8)
+    toggles[:, marks] = self._rng.random((self.devices, int(marks.sum()))) > self.BUTTON_THRESHOLD
+    buttons = (self.buttons[:, None] + np.cumsum(toggles, axis=1)) % 2
+    self.buttons = buttons[:, -1].astype(np.uint8)
+
+    return xyz, buttons
+
+  def tick(self, counter: int, ticks_per_sec: int) -> list | None:
+    '''
+      returns a datagram per device for this tick, or None while a batch is not full yet.
+      batches are computed when they are full, their samples get the times of the ticks they belong to.
+    '''
+    if self.format == 'batch':
+      self._times.append(time.time())
+      if len(self._times) < self.batch_size:
+        return None
+      xyz, buttons = self.block(counter - self.batch_size + 1, self.batch_size, ticks_per_sec)
+      datagrams = encode_batch_many(self._times, xyz[..., 0], xyz[..., 1], xyz[..., 2], buttons, buttons=1, seq=self.seq if self.sequence else None)
+      self.seq += self.batch_size
+      self._times.clear()
+      return _split(datagrams)
+
+    xyz, buttons = self.block(counter, 1, ticks_per_sec)
+    x, y, z, buttons = xyz[:, 0, 0], xyz[:, 0, 1], xyz[:, 0, 2], buttons[:, 0]
+    #a copy, the numbers of this tick must not change with the increment below.
+    seq = self.seq.copy() if self.sequence else None
+    self.seq += 1
+
+    if self.format == 'binary':
+      return _split(encode_binary_many(x, y, z, buttons, buttons=1, seq=seq, timestamp=time.time()))
+
+    #json can not be packed as an array, but one format string per device is still far cheaper than a dict and json.dumps.
+    if self.sequence:
+      now = time.time()
+      return [(JSON_SEQ_TEMPLATE % (*values, now)).encode() for values in zip(x.tolist(), y.tolist(), z.tolist(), buttons.tolist(), seq.tolist())]
+    return [(JSON_TEMPLATE % values).encode() for values in zip(x.tolist(), y.tolist(), z.tolist(), buttons.tolist())]
+
+#the datagrams of DeviceBank in the layout of json.dumps and Accelerometer.to_dict.
+JSON_TEMPLATE = '{"accelerometer": {"x": "%.2f", "y": "%.2f", "z": "%.2f"}, "button_1": %d}'
+JSON_SEQ_TEMPLATE = '{"accelerometer": {"x": "%.2f", "y": "%.2f", "z": "%.2f"}, "button_1": %d, "' + SEQ_KEY + '": %d, "' + TIME_KEY + '": %r}'
+
+def _split(datagrams) -> list[memoryview]:
+  '''
+    cuts the records of a structured array into one memoryview per datagram without copying them one by one.
+  '''
+  data = memoryview(datagrams.tobytes())
+  size = datagrams.dtype.itemsize
+  return [data[i:i + size] for i in range(0, len(data), size)]
+
+def run(ip: str = IP, port: int = PORT, rate: float = TICKS_PER_SEC, devices: int = 1, duration: float | None = None, format: str = FORMAT, batch_size: int = BATCH_SIZE, delta: bool = DELTA, sequence: bool = SEQUENCE, start: float | None = None, seed: float | None = None, bank: bool = False) -> T_Run_Stats:
+  '''
+    sends `rate` samples per second from every device until `duration` seconds are over or forever.
+
+    the loop is deadline based: tick k is due at start + k / rate, so a slow tick or a late wake up is made up by the next ticks instead of shifting all later ticks like a fixed sleep does.
+    the lateness of every tick is kept to report the send jitter. `start` is a time.time() value, so that workers in different processes begin at the same moment.
+    with `bank` all devices are simulated by a DeviceBank in numpy, which is needed for thousands of devices.
+  '''
+  random.seed(time.time() if seed is None else seed)
+  interval = 1 / rate
+  ticks_per_sec = max(1, round(rate))
+
+  if bank:
+    device_bank = DeviceBank(devices, format, batch_size, sequence, seed)
+    socks = device_bank.socks
+    tick = device_bank.tick
+  else:
+    senders = [Device(format, batch_size, delta, sequence) for _ in range(devices)]
+    socks = [device.sock for device in senders]
+    tick = lambda counter, ticks_per_sec: [device.tick(counter, counter % ticks_per_sec == 0) for device in senders]
+  total = None if duration is None else round(duration * rate)
+  #only samples that went out count, a batch carries batch_size of them and a tick without a datagram none.
+  datagram_samples = batch_size if format == 'batch' else 1
+  lateness = array('d')
+  counter = samples = datagrams = errors = 0
+
+  start_time = time.perf_counter() + ((start - time.time()) if start is not None else 0)
+
+  try:
+    while total is None or counter < total:
+      deadline = start_time + counter * interval
+      remaining = deadline - time.perf_counter()
+      if remaining > SPIN_TIME:
+        time.sleep(remaining - SPIN_TIME)
+      now = time.perf_counter()
+      while now < deadline:
+        now = time.perf_counter()
+      lateness.append(now - deadline)
+
+      for sock, message in zip(socks, tick(counter, ticks_per_sec) or ()):
+        if message:
+          try:
+            sock.sendto(message, (ip, port))
+            datagrams += 1
+            samples += datagram_samples
+          except OSError:
+            #e.g. a full send buffer, the datagram is lost like on a real network.
+            errors += 1
+      counter += 1
+  except (KeyboardInterrupt, SystemExit):
+    #ctrl+c ends a run without a duration, DIPPID turns it into SystemExit.
+    pass
+  finally:
+    for sock in socks:
+      sock.close()
+
+  return {
+    'ticks': counter,
+    'samples': samples,
+    'datagrams': datagrams,
+    'errors': errors,
+    #a run that kept up ends with the deadline of the tick after the last one, not when the last tick was sent.
+    'elapsed': max(time.perf_counter() - start_time, counter * interval, 1e-9),
+    'lateness': lateness
+  }
+
+def _percentile(values: list[float], q: float) -> float:
+  return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def report(stats: list[T_Run_Stats], rate: float, devices: int) -> str:
+  '''
+    sums up the stats of all workers: achieved against requested samples per second and the lateness of the ticks against their deadline in microseconds.
+  '''
+  elapsed = max(stat['elapsed'] for stat in stats)
+  samples = sum(stat['samples'] for stat in stats)
+  datagrams = sum(stat['datagrams'] for stat in stats)
+  errors = sum(stat['errors'] for stat in stats)
+  lateness = sorted(value for stat in stats for value in stat['lateness'])
+  mean = sum(lateness) / len(lateness) if lateness else 0.0
+
+  return '\n'.join([
+    f'{devices} devices, {elapsed:.2f} s',
+    f'requested {rate * devices:.0f} samples/s, achieved {samples / elapsed:.0f} samples/s ({samples / elapsed / (rate * devices):.1%})',
+    f'{datagrams} datagrams, {datagrams / elapsed:.0f} datagrams/s, {errors} send errors',
+    f'jitter: mean {mean * 1e6:.0f} us, p50 {_percentile(lateness, 0.5) * 1e6:.0f} us, p99 {_percentile(lateness, 0.99) * 1e6:.0f} us, max {(lateness[-1] if lateness else 0.0) * 1e6:.0f} us'
+  ])
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='simulate M5Stacks that send DIPPID data over UDP. without arguments it sends one device at TICKS_PER_SEC forever.')
+  parser.add_argument('--ip', default=IP)
+  parser.add_argument('--port', type=int, default=PORT)
+  parser.add_argument('--rate', type=float, default=TICKS_PER_SEC, help='samples per second and device')
+  parser.add_argument('--devices', type=int, default=1, help='number of simulated devices, each sends from an own socket')
+  parser.add_argument('--duration', type=float, default=None, help='seconds to send, forever if not given')
+  parser.add_argument('--processes', type=int, default=1, help='spread the devices across this many processes when one core is not fast enough')
+  parser.add_argument('--format', choices=['json', 'binary', 'batch'], default=FORMAT)
+  parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='samples per datagram of the batch format')
+  parser.add_argument('--delta', action='store_true', default=DELTA, help='json only: send the capabilities that changed')
+  parser.add_argument('--sequence', action='store_true', default=SEQUENCE, help='number every sample and add the send time')
+  parser.add_argument('--bank', action='store_true', help='simulate all devices of a process at once with numpy, for thousands of devices')
+  args = parser.parse_args()
+
+  if args.bank and args.delta:
+    parser.error('--delta is not supported with --bank')
+  if not 1 <= args.batch_size <= BATCH_MAX_SAMPLES:
+    parser.error(f'--batch-size must be between 1 and {BATCH_MAX_SAMPLES}, larger batches do not fit into the {MAX_DATAGRAM_SIZE} byte datagrams a receiver accepts by default')
+
+  processes = max(1, min(args.processes, args.devices))
+  options = (args.duration, args.format, args.batch_size, args.delta, args.sequence)
+
+  if processes == 1:
+    stats = [run(args.ip, args.port, args.rate, args.devices, *options, bank=args.bank)]
+  else:
+    start = time.time() + START_DELAY
+    #the devices are dealt out evenly, the first processes get one more if they do not split.
+    counts = [args.devices // processes + (i < args.devices % processes) for i in range(processes)]
+    jobs = [(args.ip, args.port, args.rate, count, *options, start, start + i, args.bank) for i, count in enumerate(counts)]
+    with Pool(processes) as pool:
+      try:
+        stats = pool.starmap(run, jobs)
+      except (KeyboardInterrupt, SystemExit):
+        pool.terminate()
+        return
 
-  sock.sendto(message.encode(), (IP, PORT))
+  print(report(stats, args.rate, args.devices), file=sys.stderr)
 
-  COUNTER += 1
-  time.sleep(LOOP_INTERVAL)
\ No newline at end of file
+if __name__ == '__main__':
+  main()
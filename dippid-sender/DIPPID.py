@@ -1,7 +1,10 @@
+import os
 import sys
 import json
+import struct
+import weakref
 from threading import Thread
-from time import sleep
+from time import sleep, monotonic, perf_counter
 from datetime import datetime
 import signal
 
@@ -11,7 +14,944 @@ import signal
 #import serial
 #import wiimote
 
+# compact binary format for the common capabilities, sent instead of json
+# layout (little endian):
+#   magic      2 bytes  b'DP', json always starts with '{' instead
+#   version    uint8    1 without, 2 with sequence number and send time
+#   buttons    uint8    number of buttons in the bitfield
+#   bitfield   uint8    bit i is the state of button_{i+1}
+#   seq        uint32   version 2 only, see SEQ_KEY
+#   time       float64  version 2 only, see TIME_KEY
+#   x, y, z    float32  accelerometer
+BINARY_MAGIC = b'DP'
+BINARY_VERSION = 1
+BINARY_VERSION_SEQ = 2
+_BINARY_FORMAT = struct.Struct('<2sBBBfff')
+_BINARY_FORMAT_SEQ = struct.Struct('<2sBBBIdfff')
+
+# json datagrams may carry a sequence number and the send time of the sender under these keys
+# sequence numbers count the datagrams of a sender, see SequenceTracker
+SEQ_KEY = '_seq'
+TIME_KEY = '_time'
+# only set internally when a datagram with sequence numbers is decoded to fewer samples than it carries,
+# removed from received json so a sender cannot set it
+_SAMPLES_KEY = '_samples'
+# position of the accelerometer fields in the samples of unpack_batch()
+_BATCH_FIELDS = {'x': 1, 'y': 2, 'z': 3}
+
+def is_binary(data):
+    return len(data) >= 2 and data[0] == BINARY_MAGIC[0] and data[1] == BINARY_MAGIC[1]
+
+# packs a list of button states into a bitfield, bit i is the state of button_{i+1}
+def button_bitfield(buttons):
+    bitfield = 0
+    for i, state in enumerate(buttons):
+        if state:
+            bitfield |= 1 << i
+    return bitfield
+
+# returns the binary datagram for an accelerometer value and a list of button states
+# with a sequence number, version 2 including the send time is used
+def encode_binary(x, y, z, buttons=(), seq=None, timestamp=0.0):
+    if seq is None:
+        return _BINARY_FORMAT.pack(BINARY_MAGIC, BINARY_VERSION, len(buttons), button_bitfield(buttons), x, y, z)
+    return _BINARY_FORMAT_SEQ.pack(BINARY_MAGIC, BINARY_VERSION_SEQ, len(buttons), button_bitfield(buttons), seq & 0xFFFFFFFF, timestamp, x, y, z)
+
+# decodes a binary datagram in place (bytes, bytearray or memoryview) into the same
+# dict a json datagram would give, returns None for unknown versions or a wrong size
+def decode_binary(data):
+    if len(data) == _BINARY_FORMAT.size:
+        magic, version, count, bitfield, x, y, z = _BINARY_FORMAT.unpack_from(data)
+        if version != BINARY_VERSION:
+            return None
+        values = {'accelerometer': {'x': x, 'y': y, 'z': z}}
+    elif len(data) == _BINARY_FORMAT_SEQ.size:
+        magic, version, count, bitfield, seq, timestamp, x, y, z = _BINARY_FORMAT_SEQ.unpack_from(data)
+        if version != BINARY_VERSION_SEQ:
+            return None
+        values = {SEQ_KEY: seq, TIME_KEY: timestamp, 'accelerometer': {'x': x, 'y': y, 'z': z}}
+    else:
+        return None
+    if count > 8:
+        return None
+    for i in range(count):
+        values[f'button_{i + 1}'] = (bitfield >> i) & 1
+    return values
+
+# receivers drop larger datagrams by default, see SensorUDP and SensorServer
+MAX_DATAGRAM_SIZE = 4096
+
+# batched binary format, many timestamped samples in one datagram
+# layout (little endian, 6 or 10 + 21 * count bytes):
+#   magic      2 bytes  b'DB'
+#   version    uint8    1 without, 2 with sequence number
+#   buttons    uint8    number of buttons in the bitfields
+#   count      uint16   number of samples
+#   seq        uint32   version 2 only, sequence number of the first sample, the others follow one by one
+# followed by count samples, oldest first:
+#   timestamp  float64  seconds, any clock of the sender
+#   x, y, z    float32  accelerometer
+#   bitfield   uint8    bit i is the state of button_{i+1}
+BATCH_MAGIC = b'DB'
+BATCH_VERSION = 1
+BATCH_VERSION_SEQ = 2
+_BATCH_HEADER = struct.Struct('<2sBBH')
+_BATCH_SEQ = struct.Struct('<I')
+_BATCH_SAMPLE = struct.Struct('<dfffB')
+# samples per datagram are limited by the default datagram size of the receivers,
+# a batch with sequence number and this many samples still fits, (4096 - 10) // 21 = 194
+BATCH_MAX_SAMPLES = (MAX_DATAGRAM_SIZE - _BATCH_HEADER.size - _BATCH_SEQ.size) // _BATCH_SAMPLE.size
+# a struct for the whole datagram is compiled once per version and sample count,
+# so a batch is packed and unpacked with a single call
+# senders use one or a few batch sizes, the cache is cleared if a sender cycles through more
+_batch_formats = {}
+_BATCH_FORMATS_MAX = 8
+
+def _batch_format(count, version=BATCH_VERSION):
+    batch_format = _batch_formats.get((count, version))
+    if batch_format is None:
+        if len(_batch_formats) >= _BATCH_FORMATS_MAX:
+            _batch_formats.clear()
+        header = '<2sBBHI' if version == BATCH_VERSION_SEQ else '<2sBBH'
+        batch_format = struct.Struct(header + 'dfffB' * count)
+        _batch_formats[(count, version)] = batch_format
+    return batch_format
+
+def _batch_header_size(version):
+    return _BATCH_HEADER.size + (_BATCH_SEQ.size if version == BATCH_VERSION_SEQ else 0)
+
+# returns version, number of buttons, number of samples and size of the header
+# None if the datagram is not a valid batch
+def _batch_header(data):
+    if len(data) < _BATCH_HEADER.size:
+        return None
+    magic, version, buttons, count = _BATCH_HEADER.unpack_from(data)
+    if version not in (BATCH_VERSION, BATCH_VERSION_SEQ) or buttons > 8 or count > BATCH_MAX_SAMPLES:
+        return None
+    header_size = _batch_header_size(version)
+    if len(data) != header_size + _BATCH_SAMPLE.size * count:
+        return None
+    return version, buttons, count, header_size
+
+def is_batch(data):
+    return len(data) >= 2 and data[0] == BATCH_MAGIC[0] and data[1] == BATCH_MAGIC[1]
+
+# returns the batch datagram for a list of (timestamp, x, y, z, bitfield) samples,
+# see button_bitfield() for the bitfield
+# with a sequence number, version 2 is used and the samples get seq, seq + 1, ...
+def encode_batch(samples, buttons=0, seq=None):
+    if len(samples) > BATCH_MAX_SAMPLES:
+        raise ValueError(f'a batch holds at most {BATCH_MAX_SAMPLES} samples, not {len(samples)}.')
+    if seq is None:
+        values = [BATCH_MAGIC, BATCH_VERSION, buttons, len(samples)]
+        version = BATCH_VERSION
+    else:
+        values = [BATCH_MAGIC, BATCH_VERSION_SEQ, buttons, len(samples), seq & 0xFFFFFFFF]
+        version = BATCH_VERSION_SEQ
+    for sample in samples:
+        values.extend(sample)
+    return _batch_format(len(samples), version).pack(*values)
+
+# unpacks a batch datagram in place into a flat tuple (timestamp, x, y, z, bitfield, timestamp, ...)
+# returns the number of buttons, the sequence number of the first sample (None for version 1) and the tuple,
+# None for unknown versions or a wrong size
+def unpack_batch(data):
+    header = _batch_header(data)
+    if header is None:
+        return None
+    version, buttons, count, header_size = header
+    unpacked = _batch_format(count, version).unpack_from(data)
+    if version == BATCH_VERSION_SEQ:
+        return buttons, unpacked[4], unpacked[5:]
+    return buttons, None, unpacked[4:]
+
+def _sample_values(buttons, seq, timestamp, x, y, z, bitfield):
+    values = {'timestamp': timestamp, 'accelerometer': {'x': x, 'y': y, 'z': z}}
+    for i in range(buttons):
+        values[f'button_{i + 1}'] = (bitfield >> i) & 1
+    if seq is not None:
+        values[SEQ_KEY] = seq
+    return values
+
+# decodes every sample of a batch datagram into the dict a json datagram would give, oldest first
+def decode_batch(data):
+    unpacked = unpack_batch(data)
+    if unpacked is None:
+        return None
+    buttons, seq, flat = unpacked
+    return [_sample_values(buttons, None if seq is None else (seq + i // 5) & 0xFFFFFFFF, *flat[i:i + 5]) for i in range(0, len(flat), 5)]
+
+# decodes only the newest sample of a batch datagram
+def decode_batch_latest(data):
+    header = _batch_header(data)
+    if header is None or header[2] == 0:
+        return None
+    version, buttons, count, header_size = header
+    seq = None
+    if version == BATCH_VERSION_SEQ:
+        seq = (_BATCH_SEQ.unpack_from(data, _BATCH_HEADER.size)[0] + count - 1) & 0xFFFFFFFF
+    values = _sample_values(buttons, seq, *_BATCH_SAMPLE.unpack_from(data, len(data) - _BATCH_SAMPLE.size))
+    if seq is not None:
+        # the older samples were skipped on purpose, they are not lost
+        values[_SAMPLES_KEY] = count
+    return values
+
+# numpy versions of the binary and batch formats for many senders at once, e.g. to simulate thousands of devices
+# every record of the returned structured array is one datagram, array.tobytes() holds them back to back
+# and array.dtype.itemsize is the size of each
+def _binary_dtype(version):
+    import numpy as np
+    fields = [('magic', 'S2'), ('version', 'u1'), ('buttons', 'u1'), ('bitfield', 'u1')]
+    if version == BINARY_VERSION_SEQ:
+        fields += [('seq', '<u4'), ('timestamp', '<f8')]
+    return np.dtype(fields + [('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+
+def _batch_dtype(count, version):
+    import numpy as np
+    sample = np.dtype([('timestamp', '<f8'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('bitfield', 'u1')])
+    fields = [('magic', 'S2'), ('version', 'u1'), ('buttons', 'u1'), ('count', '<u2')]
+    if version == BATCH_VERSION_SEQ:
+        fields.append(('seq', '<u4'))
+    return np.dtype(fields + [('samples', sample, (count,))])
+
+# one binary datagram per sender, x, y, z, bitfield and seq are arrays with a value per sender
+def encode_binary_many(x, y, z, bitfield, buttons=0, seq=None, timestamp=0.0):
+    import numpy as np
+    version = BINARY_VERSION if seq is None else BINARY_VERSION_SEQ
+    datagrams = np.empty(len(x), dtype=_binary_dtype(version))
+    datagrams['magic'] = BINARY_MAGIC
+    datagrams['version'] = version
+    datagrams['buttons'] = buttons
+    datagrams['bitfield'] = bitfield
+    if seq is not None:
+        datagrams['seq'] = np.asarray(seq) & 0xFFFFFFFF
+        datagrams['timestamp'] = timestamp
+    datagrams['x'] = x
+    datagrams['y'] = y
+    datagrams['z'] = z
+    return datagrams
+
+# one batch datagram per sender, x, y, z and bitfield have the shape (senders, samples),
+# timestamps one value per sample that is shared by all senders, seq one value per sender
+def encode_batch_many(timestamps, x, y, z, bitfield, buttons=0, seq=None):
+    import numpy as np
+    senders, count = np.shape(x)
+    if count > BATCH_MAX_SAMPLES:
+        raise ValueError(f'a batch holds at most {BATCH_MAX_SAMPLES} samples, not {count}.')
+    version = BATCH_VERSION if seq is None else BATCH_VERSION_SEQ
+    datagrams = np.empty(senders, dtype=_batch_dtype(count, version))
+    datagrams['magic'] = BATCH_MAGIC
+    datagrams['version'] = version
+    datagrams['buttons'] = buttons
+    datagrams['count'] = count
+    if seq is not None:
+        datagrams['seq'] = np.asarray(seq) & 0xFFFFFFFF
+    samples = datagrams['samples']
+    samples['timestamp'] = timestamps
+    samples['x'] = x
+    samples['y'] = y
+    samples['z'] = z
+    samples['bitfield'] = bitfield
+    return datagrams
+
+# detects lost, reordered, duplicated and stale datagrams of one sender by their sequence numbers
+# a window of the last WINDOW sequence numbers remembers which ones arrived,
+# so a late datagram is told apart from a duplicate
+# check() returns False for every datagram that is older than the newest one,
+# so old values never overwrite new ones
+class SequenceTracker():
+    WINDOW = 64
+    # a sequence number this far behind the newest one means that the sender restarted
+    RESTART_GAP = 1000
+
+    def __init__(self):
+        self._last = None
+        self._first = None
+        self._window = 0
+        self._last_time = None
+        self._stats = {'lost': 0, 'reordered': 0, 'duplicates': 0, 'stale': 0, 'restarts': 0}
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    # returns the send time of the newest datagram, None if no datagram carried one
+    def get_last_time(self):
+        return self._last_time
+
+    # without a sequence number, only the send time is compared
+    # count > 1 means that the datagram carries the samples seq - count + 1 to seq, e.g. a batch of which only the newest is applied
+    def check(self, seq=None, timestamp=None, count=1):
+        if seq is None:
+            if timestamp is None:
+                return True
+            if self._last_time is not None and timestamp < self._last_time:
+                self._stats['stale'] += 1
+                return False
+            self._last_time = timestamp
+            return True
+
+        last = self._last
+        # an older sequence number with a newer send time also means that the sender restarted
+        restarted = last is not None and seq <= last and timestamp is not None and self._last_time is not None and timestamp > self._last_time
+        if last is None or last - seq > SequenceTracker.RESTART_GAP or restarted:
+            if last is not None:
+                self._stats['restarts'] += 1
+            self._first = seq - count + 1
+            self._last = seq
+            self._window = (1 << min(count, SequenceTracker.WINDOW)) - 1
+            self._last_time = timestamp
+            return True
+
+        if seq > last:
+            shift = seq - last
+            self._stats['lost'] += max(0, shift - count)
+            received = (1 << min(count, shift, SequenceTracker.WINDOW)) - 1
+            self._window = ((self._window << shift) | received) & ((1 << SequenceTracker.WINDOW) - 1) if shift < SequenceTracker.WINDOW else received
+            self._last = seq
+            if timestamp is not None:
+                self._last_time = timestamp
+            return True
+
+        offset = last - seq
+        if offset >= SequenceTracker.WINDOW:
+            self._stats['stale'] += 1
+            return False
+        bit = 1 << offset
+        if self._window & bit:
+            self._stats['duplicates'] += 1
+            return False
+        self._window |= bit
+        self._stats['reordered'] += 1
+        if seq >= self._first:
+            # arrived late, it was counted as lost when a newer one arrived
+            # datagrams older than the first one were never counted
+            self._stats['lost'] -= 1
+        return False
+
+    # datagrams that were skipped on purpose, e.g. coalesced, are not lost
+    def skipped(self, count):
+        self._stats['lost'] = max(0, self._stats['lost'] - count)
+
+# json datagrams with this key set only contain the capabilities that changed since the previous datagram
+# datagrams without it are keyframes with the full state, see DeltaEncoder
+DELTA_KEY = '_delta'
+
+# turns full states into deltas on the sending side
+# every keyframe_interval-th state is sent in full, so a receiver recovers from lost deltas
+class DeltaEncoder():
+    def __init__(self, keyframe_interval=10):
+        self._keyframe_interval = keyframe_interval
+        self._last = {}
+        self._count = 0
+
+    # returns the dict to send for a full state, None if nothing changed
+    def encode(self, values):
+        keyframe = self._count % self._keyframe_interval == 0
+        self._count += 1
+
+        if keyframe:
+            self._last = dict(values)
+            return values
+
+        delta = {key: value for key, value in values.items() if key not in self._last or self._last[key] != value}
+        if not delta:
+            return None
+        self._last.update(delta)
+        delta[DELTA_KEY] = 1
+        return delta
+
+# fixed-size time series of the numeric samples of one capability
+# samples are written twice, at i and at i + size, so the newest n samples
+# are always one contiguous slice and queries return numpy views instead of copies
+# the views point into the buffer, copy them if they are kept while samples arrive
+# memory is allocated once and stays the same however long the sensor runs
+# requires numpy
+class History():
+    def __init__(self, size=1000):
+        import numpy as np
+
+        self._np = np
+        self.size = size
+        # names of the columns, e.g. ['x', 'y', 'z'] for the accelerometer, [] for a single number
+        self.fields = None
+        self._times = np.zeros(2 * size)
+        self._values = None
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def append(self, timestamp, value):
+        if self._values is None:
+            self.fields = sorted(value) if isinstance(value, dict) else []
+            self._values = self._np.zeros((2 * self.size, max(1, len(self.fields))))
+
+        try:
+            if self.fields:
+                row = [float(value[field]) for field in self.fields]
+            else:
+                row = float(value)
+        except (KeyError, TypeError, ValueError):
+            # not numeric or missing fields
+            return
+
+        i = self._count % self.size
+        self._times[i] = self._times[i + self.size] = timestamp
+        self._values[i] = self._values[i + self.size] = row
+        self._count += 1
+
+    # returns timestamps and values of the newest n samples as views, oldest first
+    # values have one column per field
+    def last(self, n=None):
+        if self._values is None:
+            return self._times[:0], self._times[:0]
+        count = len(self)
+        n = count if n is None else max(0, min(n, count))
+        end = (self._count - 1) % self.size + self.size + 1 if self._count else 0
+        return self._times[end - n:end], self._values[end - n:end]
+
+    # returns timestamps and values of the samples of the last ms milliseconds as views
+    def window(self, ms, now=None):
+        times, values = self.last()
+        if now is None:
+            now = monotonic()
+        start = times.searchsorted(now - ms / 1000)
+        return times[start:], values[start:]
+
+    def _select(self, n, ms):
+        if ms is not None:
+            return self.window(ms)[1]
+        return self.last(n)[1]
+
+    # mean, minimum and maximum per field of the newest n samples or of the last ms milliseconds,
+    # None if there is no sample
+    def mean(self, n=None, ms=None):
+        values = self._select(n, ms)
+        return values.mean(axis=0) if len(values) else None
+
+    def min(self, n=None, ms=None):
+        values = self._select(n, ms)
+        return values.min(axis=0) if len(values) else None
+
+    def max(self, n=None, ms=None):
+        values = self._select(n, ms)
+        return values.max(axis=0) if len(values) else None
+
+# extrapolates a numeric capability to a time in the near future,
+# e.g. to the time the current frame will be shown, to hide the latency of sensor, network and frame
+# fits a line through the newest `window` samples of a History and evaluates it at the requested time
+# the error is measured on the samples themselves: every new sample is compared with
+# the value predicted for its arrival time from the samples before it
+# requires numpy
+class Predictor():
+    def __init__(self, history, window=8, max_horizon=0.1, field=0):
+        self._history = history
+        self.window = window
+        # predictions further ahead than this many seconds after the newest sample are not extrapolated
+        # any further, so a stream that stops does not drift away
+        self.max_horizon = max_horizon
+        # column of the History, e.g. 0 for 'x' of the accelerometer
+        self.field = field
+        self._evaluated = 0
+        self._stats = {'predictions': 0, 'samples': 0, 'mean_abs_error': 0.0, 'rms_error': 0.0, 'mean_horizon': 0.0}
+        self._abs_error = 0.0
+        self._squared_error = 0.0
+        self._horizon = 0.0
+
+    # evaluates the line `ahead` seconds after the newest of the samples
+    def _fit(self, times, values, ahead):
+        if len(times) == 1:
+            return float(values[0])
+        # times relative to the newest sample keep the numbers small
+        times = times - times[-1]
+        mean_time = times.mean()
+        mean_value = values.mean()
+        spread = ((times - mean_time) ** 2).sum()
+        slope = ((times - mean_time) * (values - mean_value)).sum() / spread if spread > 0 else 0.0
+        return float(mean_value + slope * (ahead - mean_time))
+
+    # compares the samples that arrived since the last call with their predictions
+    def _evaluate(self):
+        new = self._history._count - self._evaluated
+        if new <= 0:
+            return
+        self._evaluated = self._history._count
+        times, values = self._history.last(new + self.window)
+        values = values[:, self.field]
+        for k in range(max(1, len(times) - new), len(times)):
+            start = max(0, k - self.window)
+            error = values[k] - self._fit(times[start:k], values[start:k], min(times[k] - times[k - 1], self.max_horizon))
+            self._stats['samples'] += 1
+            self._abs_error += abs(float(error))
+            self._squared_error += float(error) * float(error)
+
+    # returns the value expected at `at` (seconds of time.monotonic(), now by default), None without samples
+    def predict(self, at=None):
+        self._evaluate()
+        times, values = self._history.last(self.window)
+        if len(times) == 0:
+            return None
+        if at is None:
+            at = monotonic()
+        horizon = max(0.0, min(at - times[-1], self.max_horizon))
+        self._stats['predictions'] += 1
+        self._horizon += float(horizon)
+        return self._fit(times, values[:, self.field], horizon)
+
+    # returns the number of predictions, the number of samples the error was measured on,
+    # mean absolute and root mean square error and the mean horizon in seconds
+    def get_stats(self):
+        import math
+
+        stats = dict(self._stats)
+        if stats['samples']:
+            stats['mean_abs_error'] = self._abs_error / stats['samples']
+            stats['rms_error'] = math.sqrt(self._squared_error / stats['samples'])
+        if stats['predictions']:
+            stats['mean_horizon'] = self._horizon / stats['predictions']
+        return stats
+
+# filter stages for the samples of a capability, see Sensor.add_filter()
+# every stage keeps its state between calls, so a sample costs O(1)
+# process() filters a single sample, process_batch() a numpy array of samples in one call
+# process_batch requires numpy
+
+# exponential moving average, a low-pass filter
+# the higher alpha (0 < alpha <= 1), the faster the output follows the input
+class EMA():
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self._value = None
+
+    def process(self, value):
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+    # y_k = (1 - alpha)^(k + 1) * y_-1 + alpha * sum_j<=k (1 - alpha)^(k - j) * x_j,
+    # computed in blocks small enough that the powers of (1 - alpha) do not underflow
+    def process_batch(self, values):
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return values
+        if self._value is None:
+            self._value = float(values[0])
+
+        decay = 1 - self.alpha
+        if decay <= 0:
+            self._value = float(values[-1])
+            return values.copy()
+
+        block = max(1, min(len(values), int(200 / -np.log10(decay))))
+        output = np.empty_like(values)
+        for start in range(0, len(values), block):
+            chunk = values[start:start + block]
+            powers = decay ** np.arange(1, len(chunk) + 1)
+            output[start:start + len(chunk)] = powers * (self._value + self.alpha * np.cumsum(chunk / powers))
+            self._value = float(output[start + len(chunk) - 1])
+        return output
+
+# values closer than width to center become center, the others are moved
+# towards center by width, so the output does not jump at the edge of the dead zone
+class DeadZone():
+    def __init__(self, width=0.05, center=0.0):
+        self.width = width
+        self.center = center
+
+    def reset(self):
+        pass
+
+    def process(self, value):
+        offset = value - self.center
+        if abs(offset) <= self.width:
+            return self.center
+        return value - self.width if offset > 0 else value + self.width
+
+    def process_batch(self, values):
+        import numpy as np
+
+        offset = np.asarray(values, dtype=float) - self.center
+        return self.center + np.sign(offset) * np.maximum(np.abs(offset) - self.width, 0)
+
+# subtracts a calibration offset, calibrate() takes the current value as the new zero
+class Offset():
+    def __init__(self, offset=0.0):
+        self.offset = offset
+
+    def reset(self):
+        pass
+
+    def calibrate(self, value):
+        self.offset = value
+
+    def process(self, value):
+        return value - self.offset
+
+    def process_batch(self, values):
+        import numpy as np
+
+        return np.asarray(values, dtype=float) - self.offset
+
+class Clamp():
+    def __init__(self, low=-1.0, high=1.0):
+        self.low = low
+        self.high = high
+
+    def reset(self):
+        pass
+
+    def process(self, value):
+        return min(self.high, max(self.low, value))
+
+    def process_batch(self, values):
+        import numpy as np
+
+        return np.clip(np.asarray(values, dtype=float), self.low, self.high)
+
+# limits the change between two samples to max_step
+class RateLimit():
+    def __init__(self, max_step=0.1):
+        self.max_step = max_step
+        self.reset()
+
+    def reset(self):
+        self._value = None
+
+    def process(self, value):
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += min(self.max_step, max(-self.max_step, value - self._value))
+        return self._value
+
+    # every output depends on the previous one after clipping, which numpy cannot express as one
+    # operation, so the batch is filtered sample by sample but still in one call
+    def process_batch(self, values):
+        import numpy as np
+
+        output = np.empty(len(values))
+        for i, value in enumerate(np.asarray(values, dtype=float).tolist()):
+            output[i] = self.process(value)
+        return output
+
+# runs a sample through several stages in order, e.g.
+# Pipeline(Offset(), DeadZone(0.05), EMA(0.3), Clamp(-1, 1))
+class Pipeline():
+    def __init__(self, *stages):
+        self.stages = list(stages)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, value):
+        for stage in self.stages:
+            value = stage.process(value)
+        return value
+
+    def process_batch(self, values):
+        for stage in self.stages:
+            values = stage.process_batch(values)
+        return values
+
+# runs the callbacks of sensors outside of their receive threads, see Sensor.set_dispatcher()
+# notifications are coalesced per sensor and capability: while a capability waits for delivery,
+# a newer value replaces the waiting one, so consumers always get the latest value
+# at most max_pending capabilities wait per worker, if more arrive, the policy decides
+# whether the oldest waiting one (DROP_OLDEST) or the new one (DROP_NEWEST) is dropped
+# callbacks run in `workers` threads, a capability always goes to the same worker, so its values stay in order
+# with an asyncio loop instead, all callbacks run on that loop
+# receiving never waits for a callback
+class Dispatcher():
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+
+    def __init__(self, workers=1, max_pending=256, policy=DROP_OLDEST, loop=None):
+        from collections import deque
+        from threading import Condition, Lock
+
+        if policy not in (Dispatcher.DROP_OLDEST, Dispatcher.DROP_NEWEST):
+            raise ValueError(f'"{policy}" is not a policy, use Dispatcher.DROP_OLDEST or Dispatcher.DROP_NEWEST.')
+        self.max_pending = max_pending
+        self.policy = policy
+        self._loop = loop
+        self._running = True
+        workers = 1 if loop is not None else workers
+        # per worker the order in which capabilities wait, their latest values and whether the loop was woken up
+        self._queues = [deque() for _ in range(workers)]
+        self._pending = [{} for _ in range(workers)]
+        self._scheduled = [False] * workers
+        self._conditions = [Condition() for _ in range(workers)]
+        self._stats = {'submitted': 0, 'delivered': 0, 'coalesced': 0, 'dropped': 0, 'errors': 0}
+        # for each callback: calls, total and maximum time in seconds
+        self._timings = {}
+        # the receive thread and all workers update the counters and timings
+        self._stats_lock = Lock()
+        self._threads = []
+        if loop is None:
+            for worker in range(workers):
+                thread = Thread(target=self._work, args=(worker,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    # called on the receive thread, only stores the value
+    def submit(self, sensor, key, value):
+        item = (id(sensor), key)
+        worker = hash(item) % len(self._queues)
+        queue = self._queues[worker]
+        pending = self._pending[worker]
+
+        with self._conditions[worker]:
+            self._count('submitted')
+            if item in pending:
+                pending[item] = (sensor, key, value)
+                self._count('coalesced')
+                return
+
+            if len(queue) >= self.max_pending:
+                self._count('dropped')
+                if self.policy == Dispatcher.DROP_NEWEST:
+                    return
+                del pending[queue.popleft()]
+
+            queue.append(item)
+            pending[item] = (sensor, key, value)
+
+            if self._loop is None:
+                self._conditions[worker].notify()
+            elif not self._scheduled[worker]:
+                self._scheduled[worker] = True
+                self._loop.call_soon_threadsafe(self._drain, worker)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _take(self, worker):
+        item = self._queues[worker].popleft()
+        return self._pending[worker].pop(item)
+
+    def _work(self, worker):
+        condition = self._conditions[worker]
+        while True:
+            with condition:
+                while self._running and not self._queues[worker]:
+                    condition.wait()
+                if not self._running:
+                    return
+                sensor, key, value = self._take(worker)
+            self._deliver(sensor, key, value)
+
+    # runs on the asyncio loop
+    def _drain(self, worker):
+        with self._conditions[worker]:
+            items = [self._take(worker) for _ in range(len(self._queues[worker]))]
+            self._scheduled[worker] = False
+        for sensor, key, value in items:
+            self._deliver(sensor, key, value)
+
+    def _deliver(self, sensor, key, value):
+        import traceback
+
+        durations = []
+        errors = 0
+        for func in list(sensor._callbacks.get(key, ())):
+            start = perf_counter()
+            try:
+                func(value)
+            except Exception:
+                errors += 1
+                traceback.print_exc()
+            durations.append((func, perf_counter() - start))
+
+        with self._stats_lock:
+            for func, duration in durations:
+                timing = self._timings.get((key, func))
+                if timing is None:
+                    timing = self._timings[(key, func)] = [0, 0.0, 0.0]
+                timing[0] += 1
+                timing[1] += duration
+                timing[2] = max(timing[2], duration)
+            self._stats['errors'] += errors
+            self._stats['delivered'] += 1
+
+    # returns counters of submitted, delivered, coalesced and dropped notifications and of failed callbacks,
+    # and a list with the capability, name, number of calls and mean and maximum time in milliseconds of each callback
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            timings = [(key, func, *timing) for (key, func), timing in self._timings.items()]
+        stats['callbacks'] = [
+            {'key': key, 'callback': getattr(func, '__qualname__', repr(func)), 'calls': calls, 'mean_ms': total / calls * 1000, 'max_ms': longest * 1000}
+            for key, func, calls, total, longest in timings
+        ]
+        return stats
+
+    # stops the worker threads, waiting notifications are dropped
+    def stop(self):
+        self._running = False
+        for condition in self._conditions:
+            with condition:
+                condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+# records every datagram a sensor receives, see Sensor.set_recorder()
+# the log is append-only and compact, the raw datagrams are stored, so every format can be replayed:
+#   header     8 bytes  b'DIPLOG' and uint16 LOG_VERSION
+# followed by one record per datagram:
+#   time       float64  seconds since the recording started
+#   length     uint32   length of the datagram
+#   datagram   length bytes
+LOG_MAGIC = b'DIPLOG'
+LOG_VERSION = 1
+_LOG_HEADER = struct.Struct('<6sH')
+_LOG_RECORD = struct.Struct('<dI')
+
+class Recorder():
+    def __init__(self, path, append=False):
+        exists = append and os.path.exists(path) and os.path.getsize(path) >= _LOG_HEADER.size
+        self._file = open(path, 'ab' if exists else 'wb')
+        self._started = monotonic()
+        if exists:
+            # new records continue after the last time of the log
+            with Player(path) as player:
+                self._started -= player.duration()
+        else:
+            self._file.write(_LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+        self.records = 0
+
+    # appends a datagram (str, bytes or a memoryview into a receive buffer), called on the receive thread
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self._file.write(_LOG_RECORD.pack(monotonic() - self._started, len(data)))
+        self._file.write(data)
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+# plays a log of Recorder back
+# the log is memory-mapped and read record by record, so logs of many hours do not have to fit into memory
+class Player():
+    def __init__(self, path):
+        import mmap
+
+        self._path = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < _LOG_HEADER.size:
+                raise ValueError(f'"{path}" is not a DIPPID log.')
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _LOG_HEADER.unpack_from(self._map)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            self._map.close()
+            raise ValueError(f'"{path}" is not a DIPPID log of version {LOG_VERSION}.')
+        # generators of records() that are not finished yet, close() stops them
+        self._readers = weakref.WeakSet()
+
+    # yields the time and a memoryview of every datagram, oldest first
+    # the memoryview points into the log and is released when the next record is read,
+    # copy it with bytes() to keep the datagram
+    # a record that was cut off at the end, e.g. by a crash while recording, ends the log
+    def records(self):
+        reader = self._read_records()
+        self._readers.add(reader)
+        return reader
+
+    def _read_records(self):
+        data = memoryview(self._map)
+        offset = _LOG_HEADER.size
+        end = len(data)
+        try:
+            while offset + _LOG_RECORD.size <= end:
+                timestamp, length = _LOG_RECORD.unpack_from(data, offset)
+                offset += _LOG_RECORD.size
+                if offset + length > end:
+                    break
+                datagram = data[offset:offset + length]
+                try:
+                    yield timestamp, datagram
+                finally:
+                    _release(datagram)
+                offset += length
+        finally:
+            _release(data)
+
+    # returns the time of the last record
+    def duration(self):
+        last = 0.0
+        for timestamp, datagram in self.records():
+            last = timestamp
+        return last
+
+    # emits every datagram into a Sensor or, for an (ip, port) tuple, over UDP
+    # speed 1.0 keeps the original timing, 2.0 plays twice as fast, None as fast as possible
+    # the first datagram is emitted at once, the time before it was recorded is skipped
+    # returns the number of datagrams
+    def play(self, target, speed=1.0):
+        if isinstance(target, Sensor):
+            emit = target._update
+        else:
+            import socket
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            emit = lambda datagram: sock.sendto(datagram, target)
+
+        count = 0
+        started = monotonic()
+        first = None
+        for timestamp, datagram in self.records():
+            if first is None:
+                first = timestamp
+            if speed:
+                delay = started + (timestamp - first) / speed - monotonic()
+                if delay > 0:
+                    sleep(delay)
+            emit(datagram)
+            count += 1
+        return count
+
+    # stops all readers of records() and unmaps the log
+    # if a buffer of a datagram is still held, e.g. by numpy.frombuffer(), the log is unmapped when it is freed
+    def close(self):
+        for reader in list(self._readers):
+            reader.close()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    # with Player(path) as player: closes the player at the end of the block
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# a view that something else still exports, e.g. to numpy, can not be released and stays valid until it is freed
+def _release(view):
+    try:
+        view.release()
+    except BufferError:
+        pass
+
 class Sensor():
+    # modes for set_sample_mode()
+    LATEST = 'latest'
+    EVERY = 'every'
+
     # class variable that stores all instances of Sensor
     instances = []
 
@@ -23,6 +963,21 @@ class Sensor():
         # for each capability, store the last value as an object
         self._data = {}
         self._receiving = False
+        # batch datagrams carry many samples, by default only the newest one is applied
+        self._sample_mode = Sensor.LATEST
+        # rejects datagrams that arrive after a newer one and counts lost ones
+        self._sequence = SequenceTracker()
+        # for each capability with enable_history(), a History of its samples
+        self._histories = {}
+        # for each filtered capability, the capability, field and Pipeline it is computed from
+        self._filters = {}
+        # callbacks run on the receive thread unless a Dispatcher is set
+        self._dispatcher = None
+        # record published by enable_snapshot(), None until then
+        self._snapshot = None
+        self._snapshot_fields = []
+        # Recorder that gets every received datagram, None if the sensor is not recorded
+        self._recorder = None
         Sensor.instances.append(self)
 
     # stops the loop in _receive() and kills the thread
@@ -34,15 +989,107 @@ class Sensor():
             self._connection_thread.join()
 
     # runs as a thread
-    # receives json formatted data from sensor,
+    # receives json formatted or binary data from sensor,
     # stores it and notifies callbacks
+    # data may be a str, bytes or a memoryview into a receive buffer
     def _update(self, data):
-        try:
-            data_json = json.loads(data)
-        except json.decoder.JSONDecodeError:
+        if self._recorder is not None:
+            self._recorder.write(data)
+
+        if self._sample_mode == Sensor.EVERY and is_batch(data):
+            for data_json in decode_batch(data) or ():
+                self._apply(data_json)
+            return
+
+        batch = None
+        if self._filters and is_batch(data):
+            # only the newest sample is applied, but the filters see all of them
+            data_json = decode_batch_latest(data)
+            if data_json is not None:
+                batch = unpack_batch(data)[2]
+        else:
+            data_json = self._parse(data)
+        if data_json is None:
             # incomplete data
             return
 
+        self._apply(data_json, batch)
+
+    # applies a decoded datagram, a delta or a full state
+    # batch holds the flat samples of unpack_batch() if data_json is only the newest of them
+    def _apply(self, data_json, batch=None):
+        if not self._check_sequence(data_json):
+            # out of order, duplicated or stale
+            return
+
+        delta = data_json.pop(DELTA_KEY, None)
+        if self._filters:
+            self._filter(data_json, batch)
+        if delta:
+            self._update_delta(data_json)
+        else:
+            self._update_values(data_json)
+
+    # removes sequence number and send time from a decoded datagram
+    # returns False if the datagram is older than one that was already applied
+    # or if they are not numbers, json can carry anything under these keys
+    def _check_sequence(self, data_json):
+        seq = data_json.pop(SEQ_KEY, None)
+        send_time = data_json.pop(TIME_KEY, None)
+        count = data_json.pop(_SAMPLES_KEY, 1)
+        if seq is None and send_time is None:
+            return True
+        if seq is not None and (type(seq) is not int or type(count) is not int or count < 1):
+            return False
+        if send_time is not None and (type(send_time) not in (int, float) or send_time != send_time):
+            return False
+        return self._sequence.check(seq, send_time, count)
+
+    # decodes a datagram, binary if it starts with BINARY_MAGIC, json otherwise
+    # bytes are parsed without creating a str first
+    # returns None for incomplete or invalid data
+    def _parse(self, data):
+        if is_binary(data):
+            return decode_binary(data)
+        if is_batch(data):
+            return decode_batch_latest(data)
+        try:
+            # json only reads str, bytes and bytearray, a memoryview is copied once
+            data_json = json.loads(data if isinstance(data, (str, bytes, bytearray)) else data.tobytes())
+        except (UnicodeDecodeError, json.decoder.JSONDecodeError):
+            return None
+        if not isinstance(data_json, dict):
+            return None
+        # only set internally, see _SAMPLES_KEY
+        data_json.pop(_SAMPLES_KEY, None)
+        return data_json
+
+    # stores a delta, every capability in it has changed,
+    # so its values are stored without comparing them to the old ones
+    # the filters already ran in _apply()
+    def _update_delta(self, data_json):
+        if self._histories:
+            self._record(data_json)
+        if self._snapshot_fields:
+            self._publish(data_json)
+
+        for key, value in data_json.items():
+            self._add_capability(key)
+            initial = self._data[key] == []
+            self._data[key] = value
+
+            # do not notify callbacks on initialization
+            if not initial:
+                self._notify_callbacks(key)
+
+    # stores already decoded data and notifies callbacks
+    # the filters already ran in _apply() or _coalesce_datagrams()
+    def _update_values(self, data_json):
+        if self._histories:
+            self._record(data_json)
+        if self._snapshot_fields:
+            self._publish(data_json)
+
         for key, value in data_json.items():
             self._add_capability(key)
 
@@ -56,6 +1103,108 @@ class Sensor():
                 self._data[key] = value
                 self._notify_callbacks(key)
 
+    # runs the filters on a decoded datagram and adds their outputs to it
+    # with batch, the flat samples of unpack_batch(), the accelerometer filters run over all of them
+    def _filter(self, data_json, batch=None):
+        for name, (key, field, pipeline) in self._filters.items():
+            if key not in data_json:
+                continue
+            if batch is not None and key == 'accelerometer' and field in _BATCH_FIELDS:
+                import numpy as np
+
+                column = np.array(batch[_BATCH_FIELDS[field]::5])
+                data_json[name] = float(pipeline.process_batch(column)[-1])
+                continue
+            try:
+                value = float(data_json[key] if field is None else data_json[key][field])
+            except (KeyError, TypeError, ValueError):
+                continue
+            data_json[name] = pipeline.process(value)
+
+    # runs every sample of a capability, or of one field of it, through a filter Pipeline
+    # as it arrives and stores the output as the capability `name`, e.g.
+    # add_filter('acc_x', 'accelerometer', Pipeline(DeadZone(0.05), EMA(0.3)), field='x')
+    # callbacks and histories work for the filtered capability like for any other
+    def add_filter(self, name, key, pipeline, field=None):
+        self._filters[name] = (key, field, pipeline)
+        return pipeline
+
+    def remove_filter(self, name):
+        self._filters.pop(name, None)
+
+    # converts the snapshot fields of a decoded datagram to floats once and publishes a new record
+    # replacing the reference is atomic, so a reader never sees a half updated record
+    def _publish(self, data_json):
+        values = self._snapshot_values
+        changed = False
+        for i, (key, field) in enumerate(self._snapshot_fields):
+            if key in data_json:
+                try:
+                    values[i] = float(data_json[key] if field is None else data_json[key][field])
+                    changed = True
+                except (KeyError, TypeError, ValueError):
+                    pass
+        if changed:
+            self._snapshot = self._snapshot_type(self._snapshot.seq + 1, monotonic(), *values)
+
+    # publishes capabilities as one immutable record with typed fields, see get_snapshot()
+    # fields maps the name of a field in the record to a capability or a (capability, field) pair, e.g.
+    # enable_snapshot({'acc_x': ('accelerometer', 'x'), 'button_1': 'button_1'})
+    # every field is a float, 0.0 until its capability arrives
+    def enable_snapshot(self, fields):
+        from collections import namedtuple
+
+        self._snapshot_type = namedtuple('Snapshot', ['seq', 'timestamp'] + list(fields))
+        self._snapshot_values = [0.0] * len(fields)
+        self._snapshot = self._snapshot_type(0, 0.0, *self._snapshot_values)
+        self._snapshot_fields = [spec if isinstance(spec, tuple) else (spec, None) for spec in fields.values()]
+        return self._snapshot
+
+    # returns the newest record of enable_snapshot() in O(1), None if it was not enabled
+    # seq counts the records, so a reader can skip work when it has not changed,
+    # timestamp is the time.monotonic() of the datagram it was built from
+    def get_snapshot(self):
+        return self._snapshot
+
+    # adds every received sample, changed or not, to the histories with the time of arrival
+    def _record(self, data_json):
+        now = monotonic()
+        for key, history in self._histories.items():
+            if key in data_json:
+                history.append(now, data_json[key])
+
+    # keeps the newest `size` samples of a capability in a History, opt-in because it requires numpy
+    # returns the History, see get_history()
+    def enable_history(self, key, size=1000):
+        if key not in self._histories:
+            self._histories[key] = History(size)
+        return self._histories[key]
+
+    def disable_history(self, key):
+        self._histories.pop(key, None)
+
+    # returns the History of a capability, e.g. get_history('accelerometer').mean(ms=200)
+    # None if enable_history() was not called for it
+    def get_history(self, key):
+        return self._histories.get(key)
+
+    # Sensor.EVERY applies the samples of a batch datagram one after another,
+    # so callbacks see every change in order
+    # Sensor.LATEST (default) only applies the newest sample of a batch
+    def set_sample_mode(self, mode):
+        if mode not in (Sensor.LATEST, Sensor.EVERY):
+            raise ValueError(f'"{mode}" is not a sample mode, use Sensor.LATEST or Sensor.EVERY.')
+        self._sample_mode = mode
+
+    # returns counters of lost, reordered, duplicated and stale datagrams
+    # and of sender restarts, only datagrams with a sequence number are counted
+    def get_stats(self):
+        return self._sequence.get_stats()
+
+    # returns the send time of the newest datagram, None if the sender does not send it
+    def get_send_time(self):
+        return self._sequence.get_last_time()
+
     # checks if capability is available
     def has_capability(self, key):
         return key in self._capabilities
@@ -93,19 +1242,56 @@ class Sensor():
             # in case somebody wants to check if the callback was present before
             return False
 
+    # writes every datagram the sensor receives into a Recorder, None stops recording
+    # the recorder is not closed by the sensor
+    def set_recorder(self, recorder):
+        self._recorder = recorder
+
+    # hands all notifications of this sensor to a Dispatcher, None runs callbacks on the receive thread again
+    # a Dispatcher can be shared by many sensors
+    def set_dispatcher(self, dispatcher):
+        self._dispatcher = dispatcher
+
     def _notify_callbacks(self, key):
+        if self._dispatcher is not None:
+            if self._callbacks[key]:
+                self._dispatcher.submit(self, key, self._data[key])
+            return
+
         for func in self._callbacks[key]:
             func(self._data[key])
 
 # sensor connected via WiFi/UDP
 # initialized with a UDP port
 # listens to all IPs by default
+# with coalesce=True every wakeup drains all queued datagrams
+# and only the newest value of each capability is stored,
+# so values never lag behind when datagrams back up in the kernel buffer
 # requires the socket module
 class SensorUDP(Sensor):
-    def __init__(self, port, ip='0.0.0.0'):
+    # upper bound of datagrams drained per wakeup, so a flood cannot starve the callbacks
+    MAX_DRAIN = 1024
+    # default for max_datagram_size, larger datagrams are dropped and counted as truncated
+    MAX_DATAGRAM_SIZE = MAX_DATAGRAM_SIZE
+    # datagrams drained in one wakeup are received one after another into a buffer of this size
+    DRAIN_BUFFER_SIZE = 256 * 1024
+
+    def __init__(self, port, ip='0.0.0.0', coalesce=False, max_datagram_size=MAX_DATAGRAM_SIZE):
         Sensor.__init__(self)
         self._ip = ip
         self._port = port
+        self._coalesce = coalesce
+        self._max_datagram_size = max_datagram_size
+        self._stats = {'received': 0, 'coalesced': 0, 'truncated': 0}
+        # datagrams are received into this buffer and parsed from it, nothing is allocated per datagram
+        # one spare byte per datagram shows that a datagram did not fit
+        size = max_datagram_size + 1
+        if coalesce:
+            size = max(size, SensorUDP.DRAIN_BUFFER_SIZE)
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        # (start, end) of every datagram drained into the buffer
+        self._datagrams = []
         self._connect()
 
     def _connect(self):
@@ -113,51 +1299,519 @@ class SensorUDP(Sensor):
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock.bind((self._ip, self._port))
-        self._connection_thread = Thread(target=self._receive)
+        self._connection_thread = Thread(target=self._receive_coalesced if self._coalesce else self._receive)
         self._connection_thread.start()
 
+    # returns counters of received datagrams, of datagrams that were replaced
+    # by a newer one before they were applied and of datagrams that were too large
+    # next to the counters of Sensor.get_stats()
+    def get_stats(self):
+        return {**self._stats, **self._sequence.get_stats()}
+
+    # an error while a datagram is applied only drops that datagram, the thread keeps receiving
     def _receive(self):
+        import traceback
+
+        self._receiving = True
+        limit = self._max_datagram_size
+        while self._receiving:
+            nbytes, addr = self._sock.recvfrom_into(self._buffer)
+            self._stats['received'] += 1
+            if nbytes > limit:
+                self._stats['truncated'] += 1
+                continue
+            try:
+                self._update(self._view[:nbytes])
+            except Exception:
+                traceback.print_exc()
+
+    def _receive_coalesced(self):
+        import traceback
+
         self._receiving = True
+        datagrams = self._datagrams
+        space = self._max_datagram_size + 1
         while self._receiving:
-            data, addr = self._sock.recvfrom(1024)
+            # block for the first datagram, then take everything else that is queued
+            datagrams.clear()
+            nbytes, addr = self._sock.recvfrom_into(self._view[:space])
+            datagrams.append((0, nbytes))
+            end = nbytes
+            self._sock.setblocking(False)
+            try:
+                while len(datagrams) < SensorUDP.MAX_DRAIN and len(self._buffer) - end >= space:
+                    nbytes, addr = self._sock.recvfrom_into(self._view[end:end + space])
+                    datagrams.append((end, end + nbytes))
+                    end += nbytes
+            except BlockingIOError:
+                pass
+            finally:
+                self._sock.setblocking(True)
+
+            self._stats['received'] += len(datagrams)
             try:
-                data_decoded = data.decode()
-            except UnicodeDecodeError:
+                if self._recorder is not None:
+                    for start, end in datagrams:
+                        self._recorder.write(self._view[start:end])
+                self._update_values(self._coalesce_datagrams(datagrams))
+            except Exception:
+                traceback.print_exc()
+
+    # True once the newest datagrams hold every known capability, older ones would only be overwritten
+    # before the capabilities are known nothing is complete, so keys that are only in an older datagram are not lost
+    # outputs of filters are capabilities too, but no datagram contains them, so they are left out
+    def _coalesce_complete(self, seen):
+        return bool(self._capabilities) and all(key in seen or key in self._filters for key in self._capabilities)
+
+    # merges datagrams into the newest value per capability
+    # datagrams are parsed from newest to oldest, older ones are skipped
+    # as soon as every known capability has a value
+    # with filters, every datagram is parsed and every sample runs through the filters before it is merged,
+    # otherwise a filter like EMA would only see the newest sample of each wakeup
+    def _coalesce_datagrams(self, datagrams):
+        parsed = []
+        seen = set()
+        truncated = 0
+        for start, end in reversed(datagrams):
+            if parsed and not self._filters and self._coalesce_complete(seen):
+                break
+            if end - start > self._max_datagram_size:
+                truncated += 1
+                continue
+            data = self._view[start:end]
+            data_json = self._parse(data)
+            if data_json is None:
+                continue
+            batch = unpack_batch(data)[2] if self._filters and is_batch(data) else None
+            parsed.append((data_json, batch))
+            seen.update(data_json)
+
+        # sequence numbers are checked in the order the datagrams arrived,
+        # newer datagrams overwrite the values of older ones
+        values = {}
+        for data_json, batch in reversed(parsed):
+            if not self._check_sequence(data_json):
                 continue
-            self._update(data_decoded)
+            # merged deltas are compared like a full state, so the delta flag is dropped
+            data_json.pop(DELTA_KEY, None)
+            if self._filters:
+                self._filter(data_json, batch)
+            values.update(data_json)
+
+        # datagrams that were never parsed were never checked, they are not lost
+        self._sequence.skipped(len(datagrams) - len(parsed))
+        # every drained datagram except the state that is applied was coalesced, no matter if it was parsed and merged or skipped
+        self._stats['truncated'] += truncated
+        self._stats['coalesced'] += max(0, len(datagrams) - truncated - (1 if values else 0))
+        return values
+
+# sensor connected via WiFi/UDP like SensorUDP, but received by asyncio
+# instead of a thread per sensor, any number of sensors share one event loop
+# if no loop is given, all sensors share a loop that runs in a background thread
+# the sensor itself is the datagram protocol of its endpoint
+class SensorUDPAsync(Sensor):
+    # shared background loop, started with the first sensor and stopped with the last
+    _shared_loop = None
+    _shared_thread = None
+    _shared_users = 0
+
+    def __init__(self, port, ip='0.0.0.0', loop=None):
+        Sensor.__init__(self)
+        self._ip = ip
+        self._port = port
+        self._loop = loop
+        self._transport = None
+        self._connection_thread = None
+        self._connect()
+
+    @classmethod
+    def _acquire_shared_loop(cls):
+        import asyncio
+
+        if cls._shared_loop is None:
+            cls._shared_loop = asyncio.new_event_loop()
+            cls._shared_thread = Thread(target=cls._shared_loop.run_forever, daemon=True)
+            cls._shared_thread.start()
+        cls._shared_users += 1
+        return cls._shared_loop
+
+    @classmethod
+    def _release_shared_loop(cls):
+        cls._shared_users -= 1
+        if cls._shared_users == 0:
+            loop, thread = cls._shared_loop, cls._shared_thread
+            cls._shared_loop = None
+            cls._shared_thread = None
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def _connect(self):
+        import asyncio
+
+        self._owns_loop = self._loop is None
+        if self._owns_loop:
+            self._loop = SensorUDPAsync._acquire_shared_loop()
+
+        endpoint = self._loop.create_datagram_endpoint(lambda: self, local_addr=(self._ip, self._port))
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            # called from a coroutine on the loop itself, the socket is bound as soon as the caller awaits
+            self._loop.create_task(endpoint)
+        elif self._loop.is_running():
+            # loop runs in another thread, wait for the bind so that errors are raised here
+            asyncio.run_coroutine_threadsafe(endpoint, self._loop).result()
+        else:
+            # loop is not started yet, bind now
+            self._loop.run_until_complete(endpoint)
+
+    # closing the transport cancels receiving at once,
+    # no packet has to arrive first like with the thread of SensorUDP
+    def disconnect(self):
+        self._receiving = False
+        Sensor.instances.remove(self)
+
+        if self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._close_transport)
+        except RuntimeError:
+            # loop was closed by its owner in the meantime
+            pass
+        if self._owns_loop:
+            SensorUDPAsync._release_shared_loop()
+
+    def _close_transport(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    # asyncio.DatagramProtocol interface
+    def connection_made(self, transport):
+        if self not in Sensor.instances:
+            # disconnected before the endpoint was ready
+            transport.close()
+            return
+        self._transport = transport
+        self._receiving = True
+
+    # an error while a datagram is applied must not reach the event loop, it only drops that datagram
+    def datagram_received(self, data, addr):
+        try:
+            self._update(data)
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+
+    def error_received(self, exc):
+        # e.g. ICMP port unreachable, the next datagram may arrive fine
+        pass
+
+    def connection_lost(self, exc):
+        self._receiving = False
+        self._transport = None
+
+# view on a single device of a SensorServer
+# behaves like any other sensor, but receives nothing itself,
+# the server feeds it with the datagrams of its device
+class SensorDevice(Sensor):
+    def __init__(self, server, device):
+        Sensor.__init__(self)
+        # views are disconnected together with their server, not on their own
+        Sensor.instances.remove(self)
+        self._server = server
+        self._connection_thread = None
+        self.device = device
+        self.last_seen = monotonic()
+
+    def disconnect(self):
+        self._receiving = False
+
+# many devices sending to a single UDP port
+# initialized with a UDP port like SensorUDP
+# datagrams are demultiplexed by source address (ip, port) by default,
+# or by a field in the data, e.g. device_field='device_id'
+# each device gets its own SensorDevice with separate capabilities, data and callbacks
+# devices that did not send anything for `timeout` seconds disappear
+# requires the socket module
+class SensorServer(Sensor):
+    # events for register_device_callback()
+    APPEAR = 'appear'
+    DISAPPEAR = 'disappear'
+
+    # large enough for some hundred devices at 100 Hz while the thread is not scheduled
+    RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, port, ip='0.0.0.0', device_field=None, timeout=2.0, max_datagram_size=SensorUDP.MAX_DATAGRAM_SIZE):
+        Sensor.__init__(self)
+        self._ip = ip
+        self._port = port
+        self._max_datagram_size = max_datagram_size
+        # reused for every datagram, one spare byte shows that a datagram did not fit
+        self._buffer = bytearray(max_datagram_size + 1)
+        self._view = memoryview(self._buffer)
+        self._device_field = device_field
+        self._timeout = timeout
+        self._devices = {}
+        self._stats = {'received': 0, 'truncated': 0}
+        self._device_callbacks = {SensorServer.APPEAR: [], SensorServer.DISAPPEAR: []}
+        self._connect()
+
+    def _connect(self):
+        import socket
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SensorServer.RECEIVE_BUFFER_SIZE)
+        self._sock.bind((self._ip, self._port))
+        # wake up regularly to check for devices that disappeared and to stop promptly on disconnect()
+        self._sock.settimeout(min(self._timeout / 4, 0.25))
+        self._receiving = True
+        self._connection_thread = Thread(target=self._receive)
+        self._connection_thread.start()
+
+    def _receive(self):
+        import socket
+        import traceback
+
+        next_check = monotonic() + self._timeout / 4
+        while self._receiving:
+            try:
+                nbytes, addr = self._sock.recvfrom_into(self._buffer)
+            except socket.timeout:
+                nbytes = None
+            except OSError:
+                # socket closed
+                break
+
+            if nbytes is not None:
+                self._stats['received'] += 1
+                if nbytes <= self._max_datagram_size:
+                    # an error while a datagram is applied only drops that datagram
+                    try:
+                        if self._recorder is not None:
+                            self._recorder.write(self._view[:nbytes])
+                        self._receive_datagram(self._view[:nbytes], addr)
+                    except Exception:
+                        traceback.print_exc()
+                else:
+                    self._stats['truncated'] += 1
+
+            now = monotonic()
+            if now >= next_check:
+                self._remove_stale_devices(now)
+                next_check = now + self._timeout / 4
+
+        self._sock.close()
+
+    # demultiplexed by address, the view gets the datagram itself and handles it like any other sensor,
+    # so sample modes, filters over batches and recording work for devices too
+    # with a device field, the datagram is parsed here to find the device, only json can carry the field
+    def _receive_datagram(self, data, addr):
+        if self._device_field is None:
+            device = addr
+            values = None
+        else:
+            values = self._parse(data)
+            if values is None:
+                return
+            device = values.pop(self._device_field, None)
+            if device is None:
+                return
+
+        sensor = self._devices.get(device)
+        if sensor is None:
+            if values is None and self._parse(data) is None:
+                # a sender of invalid data does not appear as a device
+                return
+            sensor = SensorDevice(self, device)
+            self._devices[device] = sensor
+            self._notify_device_callbacks(SensorServer.APPEAR, sensor)
+        else:
+            sensor.last_seen = monotonic()
+
+        if values is None:
+            sensor._update(data)
+            return
+        if sensor._recorder is not None:
+            sensor._recorder.write(data)
+        sensor._apply(values)
+
+    def _remove_stale_devices(self, now):
+        stale = [sensor for sensor in self._devices.values() if now - sensor.last_seen > self._timeout]
+        for sensor in stale:
+            del self._devices[sensor.device]
+            sensor.disconnect()
+            self._notify_device_callbacks(SensorServer.DISAPPEAR, sensor)
+
+    # returns the number of received datagrams and of datagrams that were larger than max_datagram_size and dropped,
+    # the sequence counters of every device are in get_device(device).get_stats()
+    def get_stats(self):
+        return dict(self._stats)
+
+    # returns the keys of all devices that are currently sending,
+    # (ip, port) tuples or values of the device field
+    def get_devices(self):
+        return list(self._devices)
+
+    # returns the view on a single device, None if it is unknown
+    def get_device(self, device):
+        return self._devices.get(device)
+
+    # register a callback function that gets the SensorDevice
+    # when a device appears (SensorServer.APPEAR) or disappears (SensorServer.DISAPPEAR)
+    def register_device_callback(self, event, func):
+        self._device_callbacks[event].append(func)
+
+    def unregister_device_callback(self, event, func):
+        if func in self._device_callbacks.get(event, []):
+            self._device_callbacks[event].remove(func)
+            return True
+        else:
+            return False
+
+    def _notify_device_callbacks(self, event, sensor):
+        for func in self._device_callbacks[event]:
+            func(sensor)
 
 # sensor connected via serial connection (USB)
 # initialized with a path to a TTY (e.g. /dev/ttyUSB0)
 # default baudrate is 115200
+# reads whatever bytes are waiting in bulk and splits newline-delimited frames in one reused buffer
+# a lost connection is reopened by the same thread, with a delay that doubles after every failed attempt
 # requires pyserial
 class SensorSerial(Sensor):
-    def __init__(self, tty, baudrate=115200):
+    # delay before reopening a lost connection in seconds, doubled up to RECONNECT_MAX
+    RECONNECT_MIN = 0.1
+    RECONNECT_MAX = 5.0
+    # a read waits at most this many seconds, so disconnect() is noticed
+    READ_TIMEOUT = 0.1
+    # longer lines are dropped as framing errors
+    MAX_FRAME_SIZE = 4096
+
+    def __init__(self, tty, baudrate=115200, max_frame_size=MAX_FRAME_SIZE):
+        from threading import Event
+
         Sensor.__init__(self)
         self._tty = tty
         self._baudrate = baudrate
+        self._max_frame_size = max_frame_size
+        self._serial = None
+        self._buffer = bytearray()
+        # set when a line was too long, everything up to the next newline is dropped
+        self._discarding = False
+        self._stopped = Event()
+        self._stats = {'bytes': 0, 'frames': 0, 'framing_errors': 0, 'connects': 0, 'reconnects': 0}
+        self._started = monotonic()
         self._connect()
 
     def _connect(self):
+        self._receiving = True
+        self._connection_thread = Thread(target=self._run)
+        self._connection_thread.start()
+
+    def disconnect(self):
+        self._stopped.set()
+        Sensor.disconnect(self)
+
+    # returns counters of received bytes and frames, framing errors (lines that are too long or not valid json)
+    # and (re)connects, the throughput since the sensor was created and the counters of Sensor.get_stats()
+    def get_stats(self):
+        elapsed = max(monotonic() - self._started, 1e-9)
+        return {
+            **self._stats,
+            'bytes_per_sec': self._stats['bytes'] / elapsed,
+            'frames_per_sec': self._stats['frames'] / elapsed,
+            **self._sequence.get_stats()
+        }
+
+    # the only loop of the connection thread: open, read until the connection fails, wait, open again
+    def _run(self):
         import serial
 
-        self._serial = serial.Serial(self._tty)
-        self._serial.baudrate = self._baudrate
-        self._connection_thread = Thread(target=self._receive)
-        self._connection_thread.start()
+        delay = SensorSerial.RECONNECT_MIN
+        while self._receiving:
+            try:
+                self._serial = serial.Serial(self._tty, self._baudrate, timeout=SensorSerial.READ_TIMEOUT)
+            except (serial.SerialException, OSError):
+                self._stopped.wait(delay)
+                delay = min(delay * 2, SensorSerial.RECONNECT_MAX)
+                continue
+
+            self._stats['connects'] += 1
+            delay = SensorSerial.RECONNECT_MIN
+            # a partial line from the old connection is not continued on the new one
+            self._buffer.clear()
+            self._discarding = False
+            try:
+                self._receive()
+            except (serial.SerialException, OSError):
+                # connection lost, try again
+                if self._receiving:
+                    self._stats['reconnects'] += 1
+            finally:
+                self._serial.close()
 
     def _receive(self):
-        self._receiving = True
+        port = self._serial
+        while self._receiving:
+            # blocks until a byte arrives or the timeout passes, then takes everything that is waiting
+            data = port.read(max(1, port.in_waiting))
+            if data:
+                self._stats['bytes'] += len(data)
+                self._buffer += data
+                self._split_frames()
+
+    def _split_frames(self):
+        buffer = self._buffer
+        view = memoryview(buffer)
+        start = 0
         try:
-            while self._receiving:
-                data = self._serial.readline()
-                try:
-                    data_decoded = data.decode()
-                except UnicodeDecodeError:
-                    continue
-                self._update(data)
-        except:
-            # connection lost, try again
-            self._connect()
+            while True:
+                end = buffer.find(b'\n', start)
+                if end < 0:
+                    break
+                if self._discarding:
+                    self._discarding = False
+                elif end > start:
+                    # an error while a frame is applied only drops that frame
+                    try:
+                        self._frame(view[start:end])
+                    except Exception:
+                        import traceback
+
+                        traceback.print_exc()
+                start = end + 1
+        finally:
+            view.release()
+
+        # the buffer keeps its memory, only the processed frames are removed from its start
+        del buffer[:start]
+        if len(buffer) > self._max_frame_size:
+            self._stats['framing_errors'] += 1
+            self._discarding = True
+            buffer.clear()
+
+    def _frame(self, frame):
+        if frame[-1] == 13:
+            # \r\n line endings
+            frame = frame[:-1]
+        if self._recorder is not None:
+            self._recorder.write(frame)
+        if len(frame) > self._max_frame_size:
+            self._stats['framing_errors'] += 1
+            return
+        data_json = self._parse(frame)
+        if data_json is None:
+            self._stats['framing_errors'] += 1
+            return
+        self._stats['frames'] += 1
+        self._apply(data_json)
 
 # uses a Nintendo Wiimote as a sensor (connected via Bluetooth)
 # initialized with a Bluetooth address
@@ -191,6 +1845,10 @@ class SensorWiimote(Sensor):
                 self._update(f'button_' + button.lower(), state)
             sleep(0.001)
 
+    # the wiimote is polled, there are no datagrams that could be recorded
+    def set_recorder(self, recorder):
+        raise NotImplementedError('a SensorWiimote can not be recorded.')
+
     def _update(self, key, value):
         self._add_capability(key)
         
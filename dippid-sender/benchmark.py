@@ -0,0 +1,118 @@
+import argparse, json, math, random, socket, timeit
+
+from DIPPID import Sensor, DeltaEncoder, encode_binary, encode_batch
+
+'''
+  compares the json format of DIPPID-sender.py, with and without deltas, with the binary format of DIPPID.encode_binary and the batched format of DIPPID.encode_batch.
+  for every format the size of a sample, the time to encode it, the time to send and receive it over loopback and the time to parse and apply it in the Sensor are measured. parsing includes the float conversion the game does for acc_x. all times are per sample, so batches share the cost of a datagram between their samples.
+
+  usage:
+  - python benchmark.py
+  - python benchmark.py --samples 100000 --batch-size 50
+'''
+
+def _samples(count: int) -> list[tuple[float, float, float, float, int]]:
+  '''
+    samples at 1 kHz that look like DIPPID-sender.py: slow sine waves on every axis and a button that switches about twice a second.
+  '''
+  rng = random.Random(0)
+  samples = []
+  button = 0
+  for i in range(count):
+    timestamp = i / 1000
+    if rng.random() < 0.002:
+      button = 1 - button
+    samples.append((timestamp, math.sin(timestamp * 2 * math.pi * 0.5), math.sin(timestamp * 2 * math.pi * 0.3), math.cos(timestamp * 2 * math.pi * 0.2), button))
+  return samples
+
+def _encode_json(samples: list, delta: bool = False) -> list[bytes]:
+  messages = []
+  delta_encoder = DeltaEncoder()
+  for timestamp, x, y, z, button in samples:
+    accelerometer = { "x": "{0:,.2f}".format(x), "y": "{0:,.2f}".format(y), "z": "{0:,.2f}".format(z) }
+    values = { "accelerometer": accelerometer, "button_1": button }
+    if delta:
+      values = delta_encoder.encode(values)
+    if values:
+      messages.append(json.dumps(values).encode())
+  return messages
+
+def _encode_json_delta(samples: list) -> list[bytes]:
+  return _encode_json(samples, delta=True)
+
+def _encode_binary(samples: list) -> list[bytes]:
+  return [encode_binary(x, y, z, [button]) for timestamp, x, y, z, button in samples]
+
+def _batch_encoder(batch_size: int):
+  def encode(samples: list) -> list[bytes]:
+    return [encode_batch(samples[i:i + batch_size], buttons=1) for i in range(0, len(samples), batch_size)]
+  return encode
+
+def _send_receive(messages: list[bytes]) -> None:
+  receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+  receiver.bind(('127.0.0.1', 0))
+  sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  address = receiver.getsockname()
+  buffer = bytearray(65536)
+
+  #chunks stay below the receive buffer, so no datagram is dropped.
+  for start in range(0, len(messages), 1000):
+    for message in messages[start:start + 1000]:
+      sender.sendto(message, address)
+    for _ in messages[start:start + 1000]:
+      receiver.recvfrom_into(buffer)
+
+  sender.close()
+  receiver.close()
+
+def _measure(name: str, encode, mode: str, samples: list, repeat: int) -> dict:
+  sensor = Sensor()
+  Sensor.instances.remove(sensor)
+  sensor.set_sample_mode(mode)
+  #a callback on every capability, so the cost of working out what changed is part of the measurement.
+  for key in ['accelerometer', 'button_1', 'timestamp']:
+    sensor.register_callback(key, lambda value: None)
+  messages = encode(samples)
+
+  def parse_all():
+    for message in messages:
+      sensor._update(message)
+      float(sensor.get_value('accelerometer')['x'])
+
+  def timed(func) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat)) / len(samples) * 1e6
+
+  return {
+    'format': name,
+    'bytes_per_sample': sum(len(message) for message in messages) / len(samples),
+    'encode_us': timed(lambda: encode(samples)),
+    'transfer_us': timed(lambda: _send_receive(messages)),
+    'parse_us': timed(parse_all)
+  }
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='compare size, encode, transfer and parse time of the DIPPID formats.')
+  parser.add_argument('--samples', type=int, default=20000)
+  parser.add_argument('--batch-size', type=int, default=20, help='samples per datagram of the batch format')
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  samples = _samples(args.samples)
+  batch = _batch_encoder(args.batch_size)
+  results = [
+    _measure('json', _encode_json, Sensor.LATEST, samples, args.repeat),
+    _measure('json/delta', _encode_json_delta, Sensor.LATEST, samples, args.repeat),
+    _measure('binary', _encode_binary, Sensor.LATEST, samples, args.repeat),
+    _measure('batch/every', batch, Sensor.EVERY, samples, args.repeat),
+    _measure('batch/latest', batch, Sensor.LATEST, samples, args.repeat)
+  ]
+
+  json_result = results[0]
+  for result in results:
+    total = result['encode_us'] + result['transfer_us'] + result['parse_us']
+    json_total = json_result['encode_us'] + json_result['transfer_us'] + json_result['parse_us']
+    print(f"{result['format']:>12}: {result['bytes_per_sample']:5.1f} bytes/sample, encode {result['encode_us']:5.2f} us, transfer {result['transfer_us']:5.2f} us, parse {result['parse_us']:5.2f} us, {json_total / total:5.1f}x faster than json")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,61 @@
+import argparse, sys, time
+
+from DIPPID import SensorUDP, Recorder, Player
+
+'''
+  records the datagrams that arrive on a UDP port into a DIPPID log and plays logs back over UDP, e.g. to debug the game with a real M5Stack session or to load-test a receiver.
+
+  usage:
+  - python replay.py record session.diplog --port 5700
+  - python replay.py play session.diplog --port 5700 --speed 2
+  - python replay.py play session.diplog --port 5700 --fast
+'''
+
+def record(path: str, ip: str, port: int, append: bool) -> None:
+  recorder = Recorder(path, append=append)
+  sensor = SensorUDP(port, ip)
+  sensor.set_recorder(recorder)
+  print(f'recording {ip}:{port} into {path}, stop with ctrl+c', file=sys.stderr)
+
+  try:
+    while True:
+      time.sleep(1)
+      recorder.flush()
+      print(f'{recorder.records} datagrams', file=sys.stderr)
+  finally:
+    #the sensor thread may still write a last datagram, the file is closed when the process ends.
+    recorder.flush()
+
+def play(path: str, ip: str, port: int, speed: float | None) -> None:
+  with Player(path) as player:
+    start = time.perf_counter()
+    count = player.play((ip, port), speed=speed)
+    elapsed = time.perf_counter() - start
+  print(f'{count} datagrams in {elapsed:.2f} s, {count / max(elapsed, 1e-9):.0f} datagrams/s', file=sys.stderr)
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='record DIPPID datagrams into a log and play logs back over UDP.')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  record_parser = commands.add_parser('record', help='record the datagrams that arrive on a UDP port')
+  record_parser.add_argument('path')
+  record_parser.add_argument('--ip', default='0.0.0.0')
+  record_parser.add_argument('--port', type=int, default=5700)
+  record_parser.add_argument('--append', action='store_true', help='continue an existing log instead of overwriting it')
+
+  play_parser = commands.add_parser('play', help='send the datagrams of a log to a UDP port')
+  play_parser.add_argument('path')
+  play_parser.add_argument('--ip', default='127.0.0.1')
+  play_parser.add_argument('--port', type=int, default=5700)
+  play_parser.add_argument('--speed', type=float, default=1.0, help='1 keeps the original timing, 2 plays twice as fast')
+  play_parser.add_argument('--fast', action='store_true', help='play as fast as possible')
+
+  args = parser.parse_args()
+
+  if args.command == 'record':
+    record(args.path, args.ip, args.port, args.append)
+  else:
+    play(args.path, args.ip, args.port, None if args.fast else args.speed)
+
+if __name__ == '__main__':
+  main()